@@ -1,12 +1,32 @@
 import argparse
-from typing import List, Optional, Set, Tuple
+import concurrent.futures
+import contextlib
+import copy
+import filecmp
+import functools
+import io
+import itertools
+import os
+import stat
+import tempfile
+import traceback
+from typing import Any, Iterator, List, Optional, Set, Tuple
 
 from ruamel.yaml import YAML
 
+from .cache import DiskCache, FileCache
+from .extract import Extractor
+from .fastload import load_file_fast
+from .fingerprint import Fingerprints
 from .merge import merge_all
+from .output import create_fast_yaml, dumps_json
+from .pipeline import Entries, transform, transform_entries
+from .prefetch import Prefetcher
+from .state import BuildState
 from .tags import DefaultTags
-from .template import template_list, template_props, template_repeat
-from .toposort import apply_toposort
+from .timings import Timings, recording, stage
+from .traverse import is_plain
+from .watch import watch
 
 
 def create_yaml():
@@ -38,17 +58,22 @@ def path_from_config(config) -> Tuple[Optional[str], dict]:
     return None, config
 
 
-def combined_loader(config, *, yaml=None, file_loader=load_file):
+def combined_loader(config, *, yaml=None, file_loader=load_file, extract_loader=None):
     yaml = yaml or create_yaml()
     path, config = path_from_config(config)
-    if path is not None:
+    extract = "extract_from" in config
+    if path is not None and extract and extract_loader is not None:
+        # loads only the subtree, see Extractor
+        data = extract_loader(path, config["extract_from"], yaml=yaml)
+        extract = False
+    elif path is not None:
         data = file_loader(path, yaml=yaml)
     elif "value" in config:
         data = config["value"]
     elif "yaml" in config:
         data = yaml.load(config["yaml"])
 
-    if "extract_from" in config:
+    if extract:
         extract_path = config["extract_from"].split("/")
         for key in extract_path:
             data = data[key]
@@ -62,27 +87,281 @@ def combined_loader(config, *, yaml=None, file_loader=load_file):
     return data
 
 
-def dump_to_yaml(filename, data, *, yaml=None):
+def _new_file_mode() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def _file_mode(filename) -> int:
+    try:
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    except FileNotFoundError:
+        return _new_file_mode()
+
+
+def write_if_changed(filename, content: str) -> bool:
+    """atomically replace filename with content unless it already matches.
+
+    returns whether the file was written. leaving identical files alone keeps
+    their mtime, so watchers and build tools downstream do not see a change.
+    """
+    try:
+        with open(filename) as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    mode = _file_mode(filename)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp, mode)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
+
+
+def dumps_yaml(data, *, yaml=None) -> str:
+    """what dump_to_yaml writes for data"""
+    yaml = yaml or create_yaml()
+    buf = io.StringIO()
+    yaml.dump(data, buf, transform=prepend_notice)
+    return buf.getvalue()
+
+
+def dump_to_yaml(filename, data, *, yaml=None) -> bool:
+    return write_if_changed(filename, dumps_yaml(data, yaml=yaml))
+
+
+def dump_to_yaml_fast(filename, data, *, yaml=None) -> bool:
+    """dump_to_yaml through the C emitter, see FastRepresenter for how the output may differ"""
+    if isinstance(data, Entries):
+        data = data.build()
+    # ruamel hands transform bytes from the C emitter, so the notice is written ahead instead
+    buf = io.StringIO()
+    buf.write(prepend_notice(""))
+    create_fast_yaml().dump(data, buf)
+    return write_if_changed(filename, buf.getvalue())
+
+
+def dump_to_json(filename, data, *, yaml=None) -> bool:
+    if isinstance(data, Entries):
+        data = data.build()
+    return write_if_changed(filename, dumps_json(data))
+
+
+def stream_to_yaml(filename, data, *, yaml=None, chunk: int = 16) -> bool:
+    """dump_to_yaml, dumping the top-level entries of data a chunk at a time.
+
+    data may be the Entries of transform_entries, so that only one chunk of
+    the document is built and represented at any time. the output goes to a
+    temporary file which replaces filename unless they match, as with
+    write_if_changed. a block mapping or sequence dumps the same entry by
+    entry as in one go, documents for which that does not hold are dumped
+    whole.
+    """
     yaml = yaml or create_yaml()
-    with open(filename, "w") as f:
-        yaml.dump(data, f, transform=prepend_notice)
+    if not isinstance(data, Entries):
+        if not isinstance(data, (dict, list)) or not data or not is_plain(data):
+            return dump_to_yaml(filename, data, yaml=yaml)
+        data = Entries(type(data), data.items() if isinstance(data, dict) else data)
+    entries = iter(data)
+    first = list(itertools.islice(entries, 1))
+    if not first:
+        return dump_to_yaml(filename, data.container(), yaml=yaml)
+
+    mode = _file_mode(filename)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(prepend_notice(""))
+            text = ""
+            for part in itertools.chain([first], iter(lambda: list(itertools.islice(entries, chunk)), [])):
+                # a chunk ending in a keep chomped scalar is closed with a document end
+                # marker, which would split the output into documents unless it is the last
+                if text.endswith("\n...\n"):
+                    text = text[: -len("...\n")]
+                f.write(text)
+                buf = io.StringIO()
+                yaml.dump(Entries(data.container, part).build(), buf)
+                text = buf.getvalue()
+            f.write(text)
+        if os.path.exists(filename) and filecmp.cmp(tmp, filename, shallow=False):
+            os.unlink(tmp)
+            return False
+        os.chmod(tmp, mode)
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return True
 
 
-def apply_single(components, output: str, files: List[str], *, loader=combined_loader, yaml: Optional[YAML] = None):
-    components = loader(components, yaml=yaml)
-    data = [loader(p, yaml=yaml) for p in files]
-    data = merge_all(data)
-    step1 = apply_toposort(data)
-    step2 = template_repeat(components, step1)
-    step3 = template_list(components, step2)
-    step4 = template_props(components, step3)
-    return step4
+FORMATS = {"yaml": dump_to_yaml, "yaml-fast": dump_to_yaml_fast, "json": dump_to_json}
+
+
+def _load_stage(config):
+    # only labelled when recording, custom loaders may take configs path_from_config does not
+    if not recording():
+        return stage("load")
+    try:
+        path = path_from_config(config)[0]
+    except TypeError:
+        path = str(config)
+    return stage("load", input=path)
+
+
+def apply_single(
+    components,
+    output: str,
+    files: List[str],
+    *,
+    loader=combined_loader,
+    yaml: Optional[YAML] = None,
+    fingerprints: bool = False,
+    stream: bool = False,
+):
+    with _load_stage(components):
+        components = loader(components, yaml=yaml)
+    data = []
+    for p in files:
+        with _load_stage(p):
+            data.append(loader(p, yaml=yaml))
+    with stage("merge"):
+        # off by default, fingerprinting a subtree costs about as much as merge_all merging it
+        data = merge_all(data, same=Fingerprints().same if fingerprints else None)
+    # apply_toposort, template_repeat, template_list and template_props fused into one walk
+    with stage("transform"):
+        if stream:
+            # entries are transformed as they are dumped, so this is left to the dump stage
+            return transform_entries(components, data)
+        return transform(components, data)
 
 
 def all_files(from_) -> Set[str]:
     return {p[0] for p in map(path_from_config, from_) if p[0] is not None}
 
 
+def _generate(components, output, fromfiles, *, kont, apply, yaml, timings):
+    # returns what kont returned, and the Record of the output when timings are on
+    with timings.record(output) if timings is not None else contextlib.nullcontext() as record:
+        res = apply(components, output, fromfiles, yaml=yaml)
+        with stage("dump"):
+            written = kont(output, res, yaml=yaml)
+    return written, record
+
+
+_worker_state = None
+
+
+def _init_worker(apply, kont, with_yaml: bool, timings: Optional[Timings]):
+    # YAML instances do not pickle, so each worker builds its own
+    global _worker_state
+    _worker_state = dict(apply=apply, kont=kont, yaml=create_yaml() if with_yaml else None, timings=timings)
+
+
+def _generate_in_worker(components, output, fromfiles):
+    return _generate(components, output, fromfiles, **_worker_state)
+
+
+def item_dependencies(togen) -> List[Set[int]]:
+    """for each item of togen, the indices of the earlier items it has to wait for.
+
+    those are the items whose output it reads, which run_serial generates
+    first so that the item reads what they wrote, and the items which read
+    or write its output, which run_serial generates first so that they see
+    the file as it was before the item replaced it.
+    """
+    producers = {}
+    readers = {}
+    deps = []
+    for n, item in enumerate(togen):
+        inputs = {*map(os.path.abspath, item_inputs(item))}
+        output = os.path.abspath(item["output"])
+        dep = {producers[p] for p in inputs if p in producers}
+        dep |= readers.get(output, set())
+        if output in producers:
+            dep.add(producers[output])
+        deps.append(dep)
+        for p in inputs:
+            readers.setdefault(p, set()).add(n)
+        producers[output] = n
+    return deps
+
+
+def run_parallel(togen, *, kont, apply, jobs: int, with_yaml: bool, timings: Optional[Timings] = None):
+    deps = item_dependencies(togen)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(apply, kont, with_yaml, timings),
+    ) as pool:
+        futures = {}
+        waiting = list(range(len(togen)))
+
+        def submit_ready():
+            # items are submitted once the items they wait for are done, see item_dependencies.
+            # dependents of a failed item are never submitted
+            nonlocal waiting
+            blocked = []
+            for n in waiting:
+                if all(d in futures and futures[d].done() and futures[d].exception() is None for d in deps[n]):
+                    item = togen[n]
+                    futures[n] = pool.submit(_generate_in_worker, item["components"], item["output"], item["from"])
+                else:
+                    blocked.append(n)
+            waiting = blocked
+
+        try:
+            # report in config order regardless of completion order, and
+            # surface the first failing item in that order
+            submit_ready()
+            for n, item in enumerate(togen):
+                print(f"generating {item['output']}...")
+                # the items before n were written, so n has been submitted
+                submit_ready()
+                while not futures[n].done():
+                    running = [f for f in futures.values() if not f.done()]
+                    concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    submit_ready()
+                written, record = futures[n].result()
+                if timings is not None:
+                    timings.add(record)
+                yield item, written
+        except BaseException:
+            for future in futures.values():
+                future.cancel()
+            raise
+
+
+def run_serial(togen, *, kont, apply, yaml: Optional[YAML], timings: Optional[Timings] = None):
+    for item in togen:
+        output = item["output"]
+        components = item["components"]
+        fromfiles = item["from"]
+
+        print(f"generating {output}...")
+        written, record = _generate(components, output, fromfiles, kont=kont, apply=apply, yaml=yaml, timings=timings)
+        if timings is not None:
+            timings.add(record)
+        yield item, written
+
+
+def item_inputs(item) -> Set[str]:
+    return all_files([item["components"], *item["from"]])
+
+
+def input_paths(togen) -> List[str]:
+    """the distinct input paths of togen, in the order they are first loaded"""
+    configs = (c for i in togen for c in [i["components"], *i["from"]])
+    return list(dict.fromkeys(p for p, _ in map(path_from_config, configs) if p is not None))
+
+
 def run(
     config,
     *,
@@ -91,9 +370,15 @@ def run(
     apply=apply_single,
     yaml: Optional[YAML] = None,
     config_changed: bool = False,
+    jobs: int = 1,
+    state: Optional[BuildState] = None,
+    timings: Optional[Timings] = None,
+    prefetch=None,
 ):
     if files is None or config_changed:
         togen = config
+        if state is not None and not config_changed:
+            togen = state.select_stale(togen, item_inputs)
     else:
         togen = [
             i
@@ -101,30 +386,173 @@ def run(
             if (i["output"] in files) or (i["components"] in files) or (all_files(i["from"]) & files)
         ]
 
-    for item in togen:
-        output = item["output"]
-        components = item["components"]
-        fromfiles = item["from"]
+    if prefetch is not None:
+        prefetch(input_paths(togen))
 
-        print(f"generating {output}...")
-        res = apply(components, output, fromfiles, yaml=yaml)
-        kont(output, res, yaml=yaml)
+    if jobs > 1 and len(togen) > 1:
+        generated = run_parallel(
+            togen, kont=kont, apply=apply, jobs=jobs, with_yaml=yaml is not None, timings=timings
+        )
+    else:
+        generated = run_serial(togen, kont=kont, apply=apply, yaml=yaml, timings=timings)
+
+    # konts report whether they changed the output, anything else counts as written
+    counts = {True: 0, False: 0}
+    try:
+        for item, written in generated:
+            counts[written is not False] += 1
+            if state is not None:
+                state.record(item, item_inputs(item))
+    finally:
+        if state is not None:
+            state.retain(i["output"] for i in config)
+            state.save()
+    if togen:
+        print(f"{counts[True]} written, {counts[False]} unchanged")
+
+
+class Generator:
+    """generate outputs into memory, for long running callers.
+
+    the config, a YAML instance and the parsed inputs are kept between
+    calls. inputs are reparsed when they change on disk, as with FileCache,
+    the config is parsed once. outputs are returned as the data that would
+    be dumped, nothing is written; dumps_yaml gives the text.
+    """
+
+    def __init__(
+        self,
+        config=".template-config.yaml",
+        *,
+        file_loader=load_file,
+        cache_dir: Optional[str] = None,
+        fingerprints: bool = False,
+    ):
+        self.yaml = create_yaml()
+        if isinstance(config, str):
+            config = load_file(config, yaml=self.yaml)
+        self.config = config
+        self._items = {i["output"]: i for i in config}
+        if cache_dir:
+            file_loader = DiskCache(file_loader, cache_dir)
+        self.cache = FileCache(file_loader)
+        self.loader = functools.partial(combined_loader, file_loader=self.cache)
+        self.fingerprints = fingerprints
+
+    def generate(self, output: str):
+        """the data for output, raising KeyError when it is not in the config"""
+        # inline values are handed to the transforms as they are, which modify them
+        item = copy.deepcopy(self._items[output])
+        return apply_single(
+            item["components"],
+            output,
+            item["from"],
+            loader=self.loader,
+            yaml=self.yaml,
+            fingerprints=self.fingerprints,
+        )
+
+    def generate_all(self) -> Iterator[Tuple[str, Any]]:
+        """(output, data) for every output, in config order"""
+        for item in self.config:
+            yield item["output"], self.generate(item["output"])
 
 
 def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", "-c", required=False, default=".template-config.yaml")
     parser.add_argument("--only", "-o", action="store_true", default=False)
+    parser.add_argument("--cache-dir", required=False, default=None)
+    parser.add_argument("--jobs", "-j", type=int, default=1)
+    parser.add_argument("--state", required=False, default=None)
+    parser.add_argument("--watch", "-w", action="store_true", default=False)
+    parser.add_argument("--watch-interval", type=float, default=1.0)
+    parser.add_argument("--fingerprints", action="store_true", default=False)
+    parser.add_argument("--stream", action="store_true", default=False)
+    parser.add_argument("--format", choices=list(FORMATS), default="yaml")
+    parser.add_argument("--fast-load", action="store_true", default=False)
+    parser.add_argument(
+        "--timings", required=False, default=None, help="write the time and peak memory of each stage as json"
+    )
+    parser.add_argument("--profile", required=False, default=None, help="write a cProfile dump per output to a dir")
+    parser.add_argument(
+        "--lazy-extract", action="store_true", default=False, help="construct only the subtrees of extract_from"
+    )
+    parser.add_argument("--prefetch", type=int, default=0, help="read inputs ahead on this many threads")
     parser.add_argument("files", nargs="*")
     args = parser.parse_args(argv)
+    if args.lazy_extract and args.fast_load:
+        parser.error("--lazy-extract scans with the round trip parser and cannot be combined with --fast-load")
     files = set(args.files)
     only = args.only
     if not only:
         files = files or None
 
     config = load_file(args.config)
-    yaml = create_yaml()
-    run(config, files=files, kont=dump_to_yaml, yaml=yaml, config_changed=(files and args.config in files))
+    file_loader = load_file_fast if args.fast_load else load_file
+    if args.cache_dir:
+        file_loader = DiskCache(file_loader, args.cache_dir)
+    prefetcher = None
+    if args.prefetch:
+        file_loader = prefetcher = Prefetcher(file_loader, jobs=args.prefetch)
+    # inputs shared between outputs are only parsed once per run
+    file_cache = FileCache(file_loader)
+    extractor = Extractor(file_cache) if args.lazy_extract else None
+    loader = functools.partial(combined_loader, file_loader=file_cache, extract_loader=extractor)
+    apply = functools.partial(apply_single, loader=loader, fingerprints=args.fingerprints, stream=args.stream)
+    # outputs written with other options are stale
+    settings = {"format": args.format, "fast_load": args.fast_load}
+    state = BuildState.load(args.state, settings=settings) if args.state else None
+    kont = stream_to_yaml if args.stream and args.format == "yaml" else FORMATS[args.format]
+
+    def generate(files):
+        if extractor is not None:
+            extractor.expect(c for item in config for c in [item["components"], *item["from"]])
+        timings = (
+            Timings(memory=bool(args.timings), profile_dir=args.profile) if args.timings or args.profile else None
+        )
+        try:
+            run(
+                # inline values are handed to the transforms as they are, which modify them
+                copy.deepcopy(config),
+                files=files,
+                kont=kont,
+                apply=apply,
+                # a YAML instance is left unusable by a dump that raised, so every run gets its own
+                yaml=create_yaml(),
+                config_changed=(files and args.config in files),
+                jobs=args.jobs,
+                state=state,
+                timings=timings,
+                prefetch=prefetcher.prefetch if prefetcher else None,
+            )
+        finally:
+            # partial reports are kept too, they show where a failing run got to
+            if args.timings:
+                timings.save(args.timings)
+
+    generate(files)
+    if not args.watch:
+        return
+
+    def watched():
+        return {args.config, *(p for item in config for p in item_inputs(item))}
+
+    def on_change(changed):
+        nonlocal config
+        try:
+            if args.config in changed:
+                config = load_file(args.config)
+            generate(changed)
+        except Exception:
+            # keep watching, the next save will most likely fix it
+            traceback.print_exc()
+
+    print(f"watching {len(watched())} files for changes...")
+    try:
+        watch(watched, on_change, interval=args.watch_interval)
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
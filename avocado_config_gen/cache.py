@@ -0,0 +1,126 @@
+import copy
+import hashlib
+import mmap
+import os
+import pickle
+import tempfile
+
+from ruamel.yaml import __version__ as ruamel_version
+
+from .tags import DefaultTags
+
+
+class FileCache:
+    """memoise a file loader for the duration of a run.
+
+    entries are keyed by path along with the file's mtime and size so that
+    edits are picked up. the transforms mutate the trees they are given,
+    so every caller gets its own deep copy of the cached document.
+    """
+
+    def __init__(self, file_loader):
+        self.file_loader = file_loader
+        self._entries = {}
+
+    def __call__(self, path, *, yaml=None):
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._entries.get(path)
+        if cached is None or cached[0] != key:
+            cached = (key, self.file_loader(path, yaml=yaml))
+            self._entries[path] = cached
+        return copy.deepcopy(cached[1])
+
+    def clear(self):
+        self._entries.clear()
+
+
+class DiskCache:
+    """persist parsed documents between invocations.
+
+    entries are pickled into ``cache_dir`` keyed by the hash of the file's
+    content, salted with the loader and the registered tag classes so that
+    a change in either invalidates everything. the least recently used entries
+    are evicted once the directory grows beyond ``max_bytes``.
+    """
+
+    suffix = ".pickle"
+
+    def __init__(self, file_loader, cache_dir, *, max_bytes=256 * 1024 * 1024):
+        self.file_loader = file_loader
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        loader = getattr(file_loader, "__qualname__", type(file_loader).__qualname__)
+        tags = ",".join(f"{cls.__module__}.{cls.__qualname__}" for cls in DefaultTags._subclasses)
+        self._salt = f"{pickle.HIGHEST_PROTOCOL}:{ruamel_version}:{loader}:{tags}\n".encode()
+
+    def key(self, content: bytes) -> str:
+        return hashlib.sha256(self._salt + content).hexdigest()
+
+    def key_file(self, path) -> str:
+        """key() of the file's content, hashed from a memory map rather than a copy"""
+        h = hashlib.sha256(self._salt)
+        with open(path, "rb") as f:
+            try:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # empty files do not map, nor do pipes and some filesystems
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            else:
+                with m:
+                    h.update(m)
+        return h.hexdigest()
+
+    def __call__(self, path, *, yaml=None):
+        entry = os.path.join(self.cache_dir, self.key_file(path) + self.suffix)
+        try:
+            with open(entry, "rb") as f:
+                data = pickle.load(f)
+            # bump mtime, eviction drops the least recently used entries first
+            os.utime(entry)
+        except FileNotFoundError:
+            pass
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # corrupt or stale entry, reparse and overwrite it
+            pass
+        else:
+            return data
+
+        data = self.file_loader(path, yaml=yaml)
+        self._store(entry, data)
+        return data
+
+    def _store(self, entry, data):
+        try:
+            payload = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, entry)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for e in os.scandir(self.cache_dir):
+            if e.name.endswith(self.suffix):
+                st = e.stat()
+                entries.append((st.st_mtime_ns, st.st_size, e.path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
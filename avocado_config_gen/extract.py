@@ -0,0 +1,160 @@
+import copy
+import os
+
+from ruamel.yaml import YAML
+from ruamel.yaml.events import (
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+    StreamEndEvent,
+)
+from ruamel.yaml.nodes import ScalarNode
+
+_STR = "tag:yaml.org,2002:str"
+_MERGE = "tag:yaml.org,2002:merge"
+
+
+class _Fallback(Exception):
+    # the document needs loading in full to extract from it the way combined_loader does
+    pass
+
+
+def _split(extract_from):
+    return tuple(extract_from.split("/"))
+
+
+def _last(events, event):
+    """skip the rest of the node starting with event, returning its last event"""
+    depth = 0
+    while True:
+        if isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (MappingEndEvent, SequenceEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return event
+        event = next(events)
+
+
+class Extractor:
+    """extract_from for inputs read from a path, constructing only the subtrees extracted.
+
+    documents are scanned at the event level with the C parser where it is
+    available, branches not on the way to an extracted subtree are skipped
+    over without being composed or constructed. the text of each extracted
+    subtree is then loaded on its own. every subtree expected from a file
+    is extracted in the same scan, see expect(), and kept until the file
+    changes. subtrees below one already extracted are taken from it.
+    callers get their own copy, as with FileCache.
+
+    documents where that could differ from loading them and walking the
+    path load in full through file_loader instead: documents with
+    directives, paths through merge keys, tagged mappings or duplicate
+    keys, and subtrees with aliases to anchors outside of them. errors in
+    the branches skipped over are not reported, as they are not
+    constructed.
+    """
+
+    def __init__(self, file_loader):
+        self.file_loader = file_loader
+        self._expected = {}
+        self._entries = {}
+        self._scanner = YAML(typ="safe", pure=False)
+
+    def expect(self, configs):
+        """note the extract_from of loader configs, so they are extracted together"""
+        for config in configs:
+            if isinstance(config, dict) and "path" in config and "extract_from" in config:
+                self._expected.setdefault(config["path"], set()).add(_split(config["extract_from"]))
+
+    def __call__(self, path, extract_from, *, yaml):
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+        target = _split(extract_from)
+        cached = self._entries.get(path)
+        if cached is None or cached[0] != key or target not in cached[1]:
+            targets = {target, *self._expected.get(path, ())}
+            try:
+                found = self._scan(path, targets, yaml)
+            except Exception:
+                # including errors in the document, which are raised as loading it in full raises them
+                found = self._walk(self.file_loader(path, yaml=yaml), target, targets)
+            cached = (key, found)
+            self._entries[path] = cached
+        return copy.deepcopy(cached[1][target])
+
+    @staticmethod
+    def _walk(data, target, targets):
+        # as combined_loader walks the path, errors are only raised for target
+        found = {}
+        for t in sorted(targets):
+            try:
+                value = data
+                for k in t:
+                    value = value[k]
+            except Exception:
+                if t == target:
+                    raise
+                continue
+            found[t] = value
+        return found
+
+    def _scan(self, path, targets, yaml):
+        with open(path) as f:
+            text = f.read()
+        events = iter(self._scanner.parse(text))
+        next(events)
+        event = next(events)
+        if not isinstance(event, DocumentStartEvent) or event.version or event.tags:
+            raise _Fallback()
+        found = {}
+        self._node(text, events, next(events), (), targets, found, yaml)
+        next(events)
+        if not isinstance(next(events), StreamEndEvent):
+            raise _Fallback()
+        if any(t not in found for t in targets):
+            # the error is for the full walk to raise
+            raise _Fallback()
+        return found
+
+    def _node(self, text, events, event, prefix, targets, found, yaml):
+        if prefix in targets:
+            end = _last(events, event).end_mark
+            # indented as it is in the document, so the lines after the first line up
+            data = yaml.load(" " * event.start_mark.column + text[event.start_mark.index : end.index])
+            found[prefix] = data
+            for t in targets:
+                if t[: len(prefix)] == prefix and t != prefix:
+                    found.update(self._walk(data, None, {t}))
+            return
+
+        if not isinstance(event, MappingStartEvent) or event.ctag not in (None, "!"):
+            raise _Fallback()
+        seen = set()
+        while True:
+            event = next(events)
+            if isinstance(event, MappingEndEvent):
+                return
+            k = None
+            if isinstance(event, ScalarEvent):
+                tag = event.ctag
+                if tag in (None, "!"):
+                    tag = yaml.resolver.resolve(ScalarNode, event.value, event.implicit)
+                if str(tag) == _MERGE:
+                    # keys may come from elsewhere in the document
+                    raise _Fallback()
+                if str(tag) == _STR:
+                    k = event.value
+                    if k in seen:
+                        raise _Fallback()
+                    seen.add(k)
+            else:
+                _last(events, event)
+            child = (*prefix, k)
+            if k is not None and any(t[: len(child)] == child for t in targets):
+                self._node(text, events, next(events), child, targets, found, yaml)
+            else:
+                _last(events, next(events))
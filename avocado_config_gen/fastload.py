@@ -0,0 +1,99 @@
+from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedMap, CommentedSeq
+from ruamel.yaml.constructor import SafeConstructor
+from ruamel.yaml.nodes import ScalarNode, SequenceNode
+from ruamel.yaml.representer import SafeRepresenter
+from ruamel.yaml.scalarstring import LiteralScalarString
+
+from .tags import DefaultTags
+
+
+class FastConstructor(SafeConstructor):
+    """SafeConstructor with the tags of create_yaml() registered on it, rather than on SafeConstructor itself"""
+
+    def flatten_mapping(self, node):
+        # the round-trip loader keeps the keys of a mapping ahead of those it
+        # merges in, which come in the order of the mappings merged
+        sources = []
+        for k, v in node.value:
+            if k.tag == "tag:yaml.org,2002:merge":
+                sources.extend(v.value if isinstance(v, SequenceNode) else [v])
+        super().flatten_mapping(node)
+        merge = getattr(node, "merge", None)
+        if not merge or not all(isinstance(k, ScalarNode) for k, _ in node.value):
+            return
+        pairs = node.value[len(merge) :]
+        seen = {(k.tag, k.value) for k, _ in pairs}
+        for source in sources:
+            for k, v in source.value:
+                if (k.tag, k.value) not in seen:
+                    seen.add((k.tag, k.value))
+                    pairs.append((k, v))
+        node.value = pairs
+        node.merge = None
+
+    def construct_yaml_str(self, node):
+        # literal block scalars are written back as such, as with the round-trip loader
+        value = super().construct_yaml_str(node)
+        if node.style == "|":
+            return LiteralScalarString(value)
+        return value
+
+    def construct_yaml_map(self, node):
+        # flow style collections are kept as such, as round-trip containers
+        if not node.flow_style:
+            yield from super().construct_yaml_map(node)
+            return
+        data = CommentedMap()
+        data.fa.set_flow_style()
+        yield data
+        data.update(self.construct_mapping(node))
+
+    def construct_yaml_seq(self, node):
+        if not node.flow_style:
+            yield from super().construct_yaml_seq(node)
+            return
+        data = CommentedSeq()
+        data.fa.set_flow_style()
+        yield data
+        data.extend(self.construct_sequence(node))
+
+
+FastConstructor.add_constructor("tag:yaml.org,2002:str", FastConstructor.construct_yaml_str)
+FastConstructor.add_constructor("tag:yaml.org,2002:map", FastConstructor.construct_yaml_map)
+FastConstructor.add_constructor("tag:yaml.org,2002:seq", FastConstructor.construct_yaml_seq)
+
+
+class _Representer(SafeRepresenter):
+    # fast loaders do not dump, this only keeps register_class off SafeRepresenter
+    pass
+
+
+def create_fast_loader() -> YAML:
+    """a YAML for loading only, using the C parser when it is available.
+
+    documents come back as plain dicts, lists and scalars, except for flow
+    style collections and literal block scalars. comments, folded block
+    scalars, number formatting such as 0x1f or 1.50 and the time zones of
+    timestamps in the inputs are not carried through to the outputs.
+    """
+    yaml = YAML(typ="safe", pure=False)
+    yaml.Constructor = FastConstructor
+    # register_class adds representers too, which would otherwise go to the SafeRepresenter of every safe YAML
+    yaml.Representer = _Representer
+    for cls in DefaultTags._subclasses:
+        yaml.register_class(cls)
+    return yaml
+
+
+# created on first use, once per process
+_loader = None
+
+
+def load_file_fast(path: str, *, yaml=None):
+    """load_file with the loader of create_fast_loader(), yaml is not used"""
+    global _loader
+    if _loader is None:
+        _loader = create_fast_loader()
+    with open(path, "rb") as f:
+        return _loader.load(f)
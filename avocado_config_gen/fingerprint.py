@@ -0,0 +1,64 @@
+from typing import Optional
+
+from .merge import Mergeable
+from .traverse import is_plain
+
+_SCALARS = (str, int, float, type(None))
+_PLAIN_SCALARS = frozenset((str, int, float, bool, type(None)))
+_NODE = object()
+
+
+class Fingerprints:
+    """structural fingerprints of documents, memoised per node.
+
+    only plain dicts and lists of plain dicts, lists and scalars have a
+    fingerprint. every distinct structure, down to types and key order, is
+    numbered once, so two nodes with the same fingerprint are equal and
+    merging them gives back the left one itself, which the result then
+    shares rather than copies. the table compares structures exactly,
+    there are no collisions to worry about.
+
+    nodes are cached by identity for the lifetime of the index, which keeps
+    them alive so ids stay valid.
+    """
+
+    def __init__(self):
+        self._memo = {}
+        self._table = {}
+
+    def fingerprint(self, obj) -> Optional[int]:
+        cached = self._memo.get(id(obj))
+        if cached is not None:
+            return cached[1]
+        res = self._fingerprint(obj)
+        self._memo[id(obj)] = (obj, res)
+        return res
+
+    def _fingerprint(self, obj) -> Optional[int]:
+        t = type(obj)
+        if t is not dict and t is not list:
+            if not isinstance(obj, (dict, list)) or isinstance(obj, Mergeable) or not is_plain(obj):
+                return None
+        children = [i for kv in obj.items() for i in kv] if isinstance(obj, dict) else obj
+        key = [t]
+        memo = self._memo
+        for i in children:
+            if type(i) in _PLAIN_SCALARS or isinstance(i, _SCALARS):
+                # nan is not equal to itself, so it does not merge with itself either
+                if i != i:
+                    return None
+                key += (type(i), i)
+                continue
+            cached = memo.get(id(i))
+            f = cached[1] if cached is not None else self.fingerprint(i)
+            if f is None:
+                return None
+            key += (_NODE, f)
+        return self._table.setdefault(tuple(key), len(self._table))
+
+    def same(self, left, right) -> bool:
+        """whether merge(left, right) would be equal to left"""
+        if not isinstance(left, (dict, list)) or not isinstance(right, (dict, list)):
+            return False
+        f = self.fingerprint(left)
+        return f is not None and (left is right or f == self.fingerprint(right))
@@ -17,6 +17,13 @@ class NonMergeableTypesError(TypeError):
 
 
 class Mergeable(abc.ABC):
+    __slots__ = ()
+
+    # set when a.merge(b) == b.merge(a) holds by construction for two
+    # instances of the same type, so merge() need not compute both sides
+    # to check that they commute
+    symmetric = False
+
     @abc.abstractmethod
     def merge(self, other):
         ...
@@ -24,6 +31,11 @@ class Mergeable(abc.ABC):
     def rmerge(self, other):
         return self.merge(other)
 
+    @classmethod
+    def merge_many(cls, items):
+        """merge several instances of cls at once, as merge_all would pairwise"""
+        return NotImplemented
+
 
 def select_type(left, right, other=None):
     if left is right or left == right:
@@ -37,7 +49,17 @@ def select_type(left, right, other=None):
     return other
 
 
-def merge(left, right, coallesce_none=False):
+def merge(left, right, coallesce_none=False, *, same=None):
+    """same, when given, is called as same(left, right) on pairs about to be
+    merged and returns whether merging them would give back left, as
+    Fingerprints.same does. such pairs are not walked any further.
+    """
+    if same is not None and same(left, right):
+        return left
+    if isinstance(left, Mergeable) and left.symmetric and type(left) is type(right):
+        res = left.merge(right)
+        if res is not NotImplemented:
+            return res
     x = 0
     if isinstance(left, Mergeable):
         res = left.merge(right)
@@ -66,7 +88,7 @@ def merge(left, right, coallesce_none=False):
             t = select_type(type(left), type(right), dict)
             return t(
                 (
-                    *((k, (merge(left[k], right[k])) if k in right else left[k]) for k in left),
+                    *((k, (merge(left[k], right[k], same=same)) if k in right else left[k]) for k in left),
                     *((k, right[k]) for k in right if k not in left),
                 )
             )
@@ -102,10 +124,38 @@ def merge(left, right, coallesce_none=False):
     raise NonMergeableTypesError(f"Cannot merge {type(left)} and {type(right)} or values conflict")
 
 
-def merge_all(items):
+def _is_plain_dict(obj):
+    return isinstance(obj, dict) and not isinstance(obj, Mergeable)
+
+
+def merge_all(items, *, same=None):
+    """merge(merge(merge(a, b), c), ...) without rebuilding the result at each step.
+
+    when all items are plain dicts they are merged in one go, key by key,
+    and values are only merged further where two or more items share a
+    key. anything else is folded pairwise with merge. same is passed on
+    to merge.
+    """
     if not items:
         raise ValueError("Cannot merge no items")
+    if same is not None and len(items) > 1 and all(same(items[0], i) for i in items[1:]):
+        return items[0]
+    if len(items) > 1 and all(_is_plain_dict(i) for i in items):
+        t = type(items[0])
+        for i in items[1:]:
+            t = select_type(t, type(i), dict)
+        values = {}
+        for i in items:
+            for k, v in i.items():
+                values.setdefault(k, []).append(v)
+        return t((k, v[0] if len(v) == 1 else merge_all(v, same=same)) for k, v in values.items())
+    first = items[0]
+    if len(items) > 1 and isinstance(first, Mergeable) and first.symmetric:
+        if all(type(i) is type(first) for i in items):
+            res = type(first).merge_many(items)
+            if res is not NotImplemented:
+                return res
     res = items[0]
     for i in items[1:]:
-        res = merge(res, i)
+        res = merge(res, i, same=same)
     return res
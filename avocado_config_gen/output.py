@@ -0,0 +1,131 @@
+import json
+
+from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedMap, CommentedOrderedMap, CommentedSeq, CommentedSet
+from ruamel.yaml.constructor import SafeConstructor
+from ruamel.yaml.emitter import Emitter
+from ruamel.yaml.representer import RoundTripRepresenter, SafeRepresenter
+from ruamel.yaml.scalarbool import ScalarBoolean
+from ruamel.yaml.scalarfloat import ScalarFloat
+from ruamel.yaml.scalarint import ScalarInt
+from ruamel.yaml.scalarstring import FoldedScalarString, LiteralScalarString, ScalarString
+
+from .merge import SET_TYPES
+from .tags import DAG, DefaultTags, StrSet
+
+
+class _Analyzer(Emitter):
+    # only used for analyze_scalar, which looks up the yaml version to write
+    use_version = None
+
+    @property
+    def serializer(self):
+        return self
+
+
+_analyzer = _Analyzer(None, allow_unicode=True)
+_STYLES = {LiteralScalarString: "|", FoldedScalarString: ">"}
+
+
+class FastRepresenter(SafeRepresenter):
+    """SafeRepresenter for the C emitter, writing what create_yaml() would.
+
+    round-trip containers keep their key order and flow style, literal and
+    folded strings their style and numbers their original formatting.
+    comments and anchors are not written, merge keys are written out
+    expanded and libyaml escapes characters outside the basic multilingual
+    plane and unicode line breaks in double quoted strings. plain strings
+    with a word longer than the line width, such as long urls or digests,
+    are written after their key, where create_yaml() starts a new line.
+    """
+
+    insert_underscore = RoundTripRepresenter.insert_underscore
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_flow_style = False
+        self.sort_base_mapping_type_on_output = False
+
+    def ignore_aliases(self, data):
+        return True
+
+    def represent_str(self, data):
+        # where a string cannot be written plain, the emitter of create_yaml()
+        # double quotes those with line breaks or single quotes and libyaml
+        # single quotes them
+        style = None
+        if "\n" in data or ("'" in data and not _analyzer.analyze_scalar(data).allow_block_plain):
+            style = '"'
+        return self.represent_scalar("tag:yaml.org,2002:str", data, style=style)
+
+    def represent_commented_map(self, data):
+        node = self.represent_dict(data)
+        if data.fa.flow_style() is not None:
+            node.flow_style = data.fa.flow_style()
+        return node
+
+    def represent_commented_seq(self, data):
+        node = self.represent_list(data)
+        if data.fa.flow_style() is not None:
+            node.flow_style = data.fa.flow_style()
+        return node
+
+    def represent_scalar_string(self, data):
+        return self.represent_scalar("tag:yaml.org,2002:str", str(data), style=_STYLES.get(type(data)))
+
+    def represent_round_trip_scalar(self, data):
+        # the C emitter only takes exact strs, and no anchors
+        node = RoundTripRepresenter.yaml_representers[type(data)](self, data)
+        node.value = str(node.value)
+        node.anchor = None
+        return node
+
+
+FastRepresenter.add_representer(str, FastRepresenter.represent_str)
+FastRepresenter.add_representer(CommentedMap, FastRepresenter.represent_commented_map)
+FastRepresenter.add_representer(CommentedSeq, FastRepresenter.represent_commented_seq)
+FastRepresenter.add_representer(CommentedOrderedMap, SafeRepresenter.represent_ordereddict)
+FastRepresenter.add_representer(CommentedSet, SafeRepresenter.represent_set)
+for _cls in RoundTripRepresenter.yaml_representers:
+    if isinstance(_cls, type) and issubclass(_cls, ScalarString):
+        FastRepresenter.add_representer(_cls, FastRepresenter.represent_scalar_string)
+    elif isinstance(_cls, type) and issubclass(_cls, (ScalarInt, ScalarFloat, ScalarBoolean)):
+        FastRepresenter.add_representer(_cls, FastRepresenter.represent_round_trip_scalar)
+
+
+class _Constructor(SafeConstructor):
+    # fast dumpers do not load, this only keeps register_class off SafeConstructor
+    pass
+
+
+def create_fast_yaml() -> YAML:
+    """a YAML for dumping only, using the C emitter when it is available"""
+    yaml = YAML(typ="safe", pure=False)
+    yaml.Representer = FastRepresenter
+    # register_class adds constructors too, which would otherwise go to the SafeConstructor of every safe YAML
+    yaml.Constructor = _Constructor
+    for cls in DefaultTags._subclasses:
+        yaml.register_class(cls)
+    yaml.default_flow_style = False
+    return yaml
+
+
+def to_json(obj):
+    """obj as plain json types, with tags converted as they are dumped to yaml"""
+    if isinstance(obj, DAG):
+        obj = obj.finalize_to_list()
+    elif isinstance(obj, StrSet):
+        return "\n".join(sorted(str(i) for i in obj))
+    elif isinstance(obj, SET_TYPES):
+        obj = sorted(obj)
+    if isinstance(obj, dict):
+        return {k: to_json(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [to_json(i) for i in obj]
+    if isinstance(obj, ScalarBoolean):
+        return bool(obj)
+    return obj
+
+
+def dumps_json(obj) -> str:
+    return json.dumps(to_json(obj), indent=2, ensure_ascii=False) + "\n"
@@ -0,0 +1,131 @@
+from .template import ItemFilter, config_list, expand_repeat, insert_list, insert_props
+from .toposort import do_toposort
+from .traverse import Untouched
+
+# the passes apply_single used to run one after another, in that order
+TOPOSORT, REPEAT, LIST, PROPS, DONE = range(5)
+DIRECTIVES = ("__toposort", "__template_repeat", "__template_list", "__template_props")
+
+
+def _without(obj, key):
+    return type(obj)((k, v) for k, v in obj.items() if k != key)
+
+
+class Pipeline:
+    """apply_toposort, template_repeat, template_list and template_props in a single walk.
+
+    walk(obj, start, end, children) returns what running passes start..end-1
+    over obj one after another would return. obj has already had the passes
+    before start applied to itself, and its children the passes before
+    children. deferring the children lets every container be rebuilt once
+    rather than once per pass. where a pass does not recurse (expanded
+    templates, inserted lists and props) the later passes walk its output
+    as a whole, exactly as the separate passes did.
+
+    subtrees without directives come out of every pass equal to what went
+    in, so they are returned as they are rather than copied.
+    """
+
+    def __init__(self, items):
+        self.select = ItemFilter(items)
+        self.untouched = Untouched(DIRECTIVES)
+
+    def walk(self, obj, start=TOPOSORT, end=DONE, children=None):
+        if children is None:
+            children = start
+        if (start >= end and children >= end) or self.untouched(obj):
+            return obj
+        if isinstance(obj, dict):
+            return self._dict(obj, start, end, children)
+        if isinstance(obj, list):
+            if start <= REPEAT < end:
+                return type(obj)([j for i in obj for j in self._element(i, children, end, children)])
+            return type(obj)([self.walk(i, children, end) for i in obj])
+        return obj
+
+    def _toposort(self, obj, config, end):
+        # nodes come back with their children pending but are not themselves
+        # toposorted again, as in apply_toposort
+        nodes = do_toposort(obj, config)
+        if REPEAT < end:
+            return [j for n in nodes for j in self._element(n, REPEAT, end, TOPOSORT)]
+        return [self.walk(n, REPEAT, end, TOPOSORT) for n in nodes]
+
+    def _element(self, obj, start, end, children):
+        # a list element while its list is being repeated, returns what it expands to
+        if start == TOPOSORT and isinstance(obj, dict):
+            config = obj.pop("__toposort", None)
+            if config:
+                return [self._toposort(obj, config, end)]
+        if isinstance(obj, dict) and "__template_repeat" in obj:
+            config = self.walk(obj["__template_repeat"], children, REPEAT)
+            obj = _without(obj, "__template_repeat")
+            if config:
+                templ = self.walk(obj, REPEAT, REPEAT, children)
+                return [self.walk(i, REPEAT + 1, end) for i in expand_repeat(self.select, templ, config)]
+        return [self.walk(obj, REPEAT, end, children)]
+
+    def _dict(self, obj, start, end, children):
+        if start == TOPOSORT < end:
+            config = obj.pop("__toposort", None)
+            if config:
+                return self._toposort(obj, config, end)
+
+        for stage, key in ((LIST, "__template_list"), (PROPS, "__template_props")):
+            if not (start <= stage < end) or key not in obj:
+                continue
+            config = self.walk(obj[key], children, stage)
+            obj = _without(obj, key)
+            if stage == PROPS:
+                config = config_list(config)
+            if not config:
+                continue
+            insert = insert_list if stage == LIST else insert_props
+            res = insert(self.select, self.walk(obj, stage, stage, children), config)
+            return self.walk(res, stage + 1, end)
+
+        return type(obj)((k, self.walk(v, children, end)) for k, v in obj.items())
+
+
+def transform(items, obj):
+    return Pipeline(items).walk(obj)
+
+
+class Entries:
+    """the top level of a document, as the container type and an iterator over its entries.
+
+    entries are pairs for dicts and items for lists. build() gives back the
+    whole container.
+    """
+
+    def __init__(self, container, entries):
+        self.container = container
+        self.entries = entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def build(self):
+        if issubclass(self.container, dict):
+            return self.container(self.entries)
+        return self.container(list(self.entries))
+
+
+def transform_entries(items, obj):
+    """transform(items, obj), transforming the top-level entries one at a time as they are consumed.
+
+    when the top level itself carries a directive the whole result is built
+    up front, as its entries are not known until then. documents that do
+    not come out as a dict or list are returned as they are.
+    """
+    pipeline = Pipeline(items)
+    if isinstance(obj, dict) and not any(k in obj for k in DIRECTIVES):
+        return Entries(type(obj), ((k, pipeline.walk(v)) for k, v in obj.items()))
+    if isinstance(obj, list):
+        return Entries(type(obj), (j for i in obj for j in pipeline._element(i, TOPOSORT, DONE, TOPOSORT)))
+    res = pipeline.walk(obj)
+    if isinstance(res, dict):
+        return Entries(type(res), res.items())
+    if isinstance(res, list):
+        return Entries(type(res), res)
+    return res
@@ -0,0 +1,63 @@
+import concurrent.futures
+import functools
+import os
+
+_CHUNK = 1 << 20
+
+
+def _read(path):
+    # the content is dropped, it is left in the page cache for the loader
+    buf = bytearray(_CHUNK)
+    with open(path, "rb", buffering=0) as f:
+        while f.readinto(buf):
+            pass
+
+
+class Prefetcher:
+    """read input files ahead of their use on a thread pool.
+
+    prefetch(paths) starts reading paths in the background. loading a path
+    waits for its read to finish, so the loader is served from the page
+    cache instead of waiting on the disk or network filesystem, and parsing
+    one file overlaps with reading the next ones. wrapped loaders still
+    open and read the files themselves, so caches keyed by mtime or content
+    see the same files as without prefetching.
+
+    only reads still running are kept track of. copies in other processes,
+    forked or unpickled, do not wait for reads of the parent, they only find
+    them in the page cache.
+    """
+
+    def __init__(self, file_loader, *, jobs: int = 8):
+        self.file_loader = file_loader
+        self.jobs = jobs
+        self._pool = None
+        self._pending = {}
+        self._pid = os.getpid()
+
+    def prefetch(self, paths):
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="prefetch")
+        for path in paths:
+            if path not in self._pending:
+                future = self._pending[path] = self._pool.submit(_read, path)
+                # reads of files that are never loaded, such as those served from a FileCache, are not kept
+                future.add_done_callback(functools.partial(self._done, path))
+
+    def _done(self, path, future):
+        if self._pending.get(path) is future:
+            self._pending.pop(path, None)
+
+    def __getstate__(self):
+        # the pool and its futures do not pickle, as for --jobs workers started by spawn or forkserver
+        return {**self.__dict__, "_pool": None, "_pending": {}}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _pid=os.getpid())
+
+    def __call__(self, path, *, yaml=None):
+        future = self._pending.pop(path, None)
+        if future is not None and os.getpid() == self._pid:
+            # errors are left for the loader to raise
+            concurrent.futures.wait([future])
+        return self.file_loader(path, yaml=yaml)
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, Optional
+
+from .output import to_json
+
+
+def tool_version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("avocado-config-gen")
+    except ImportError:
+        return "unknown"
+
+
+def hash_file(path: str) -> Optional[str]:
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+def hash_entry(item) -> str:
+    # tags in inline values are converted as they are dumped, sets and DAGs
+    # have no repr that is the same in every process. anything else json
+    # does not know raises rather than making the entry always stale
+    data = json.dumps(to_json(item), sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class BuildState:
+    """what each output was last generated from.
+
+    for every output we record the tool version, a hash of its config
+    entry, and content hashes of its inputs and of the output itself. an
+    output is stale when any of those no longer match.
+    """
+
+    format_version = 1
+
+    def __init__(self, path: str, outputs: Optional[Dict[str, dict]] = None, settings: Optional[dict] = None):
+        self.path = path
+        self.outputs = outputs or {}
+        # options affecting what is written, outputs recorded with others are stale
+        self.settings = settings
+        self._hashes: Dict[str, Optional[str]] = {}
+
+    @classmethod
+    def load(cls, path: str, settings: Optional[dict] = None) -> "BuildState":
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return cls(path, settings=settings)
+        if not isinstance(data, dict) or data.get("version") != cls.format_version:
+            return cls(path, settings=settings)
+        return cls(path, data.get("outputs", {}), settings)
+
+    def save(self):
+        data = {"version": self.format_version, "outputs": self.outputs}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _hash(self, path: str) -> Optional[str]:
+        # inputs are hashed once per run, they are shared between outputs
+        if path not in self._hashes:
+            self._hashes[path] = hash_file(path)
+        return self._hashes[path]
+
+    def fingerprint(self, item, inputs: Iterable[str]) -> dict:
+        res = {
+            "tool": tool_version(),
+            "entry": hash_entry(item),
+            "inputs": {p: self._hash(p) for p in sorted(inputs)},
+        }
+        if self.settings:
+            res["settings"] = self.settings
+        return res
+
+    def is_stale(self, item, inputs: Iterable[str]) -> bool:
+        recorded = self.outputs.get(item["output"])
+        if recorded is None:
+            return True
+        if recorded.get("output") != hash_file(item["output"]):
+            return True
+        return {k: v for k, v in recorded.items() if k != "output"} != self.fingerprint(item, inputs)
+
+    def select_stale(self, items, inputs_of) -> list:
+        # an output consumed as the input of a later item makes that item stale too,
+        # paths are compared absolute as for item_dependencies
+        stale = []
+        changed = set()
+        for item in items:
+            inputs = inputs_of(item)
+            if not changed.isdisjoint(map(os.path.abspath, inputs)) or self.is_stale(item, inputs):
+                stale.append(item)
+                changed.add(os.path.abspath(item["output"]))
+        return stale
+
+    def record(self, item, inputs: Iterable[str]):
+        output = item["output"]
+        self._hashes.pop(output, None)
+        self.outputs[output] = {**self.fingerprint(item, inputs), "output": hash_file(output)}
+
+    def retain(self, outputs: Iterable[str]):
+        keep = set(outputs)
+        self.outputs = {k: v for k, v in self.outputs.items() if k in keep}
@@ -1,8 +1,12 @@
+import heapq
+import itertools
+
 from . import toposort
 from .merge import SET_TYPES, Mergeable, merge, select_type
 
 
 class DefaultTags:
+    __slots__ = ()
     _subclasses = []
 
     def __init_subclass__(cls) -> None:
@@ -10,7 +14,9 @@ class DefaultTags:
 
 
 class SetList(DefaultTags, Mergeable, set):
+    __slots__ = ()
     yaml_tag = "!set"
+    symmetric = True
 
     @classmethod
     def from_yaml(cls, constructor, node):
@@ -30,48 +36,175 @@ class SetList(DefaultTags, Mergeable, set):
 
 
 class DAG(DefaultTags, Mergeable):
-    def __init__(self, objsbykey, successors, prune_unreachable=None, required_keys=None):
+    """nodes by key, ordered by their successors.
+
+    successors maps a key to the keys that come before it. chains are
+    sequences of keys where every key has all the keys before it as
+    successors, which is how assoclists are ordered without building a
+    quadratic number of successor sets.
+    """
+
+    __slots__ = ("objsbykey", "successors", "chains", "prune_unreachable", "required_keys")
+    symmetric = True
+
+    def __init__(self, objsbykey, successors, prune_unreachable=None, required_keys=None, chains=()):
         self.objsbykey = objsbykey
         self.successors = successors
+        self.chains = chains
         self.prune_unreachable = prune_unreachable
         self.required_keys = required_keys or {*[]}
 
     def merge(self, other):
         if not isinstance(other, DAG):
             return NotImplemented
-        t = select_type(type(self), type(other), DAG)
+        return DAG.merge_many([self, other])
 
-        objsbykey = merge(self.objsbykey, other.objsbykey)
-        successors = merge(self.successors, other.successors)
-        prune_unreachable = merge(self.prune_unreachable, other.prune_unreachable, coallesce_none=True)
-        required_keys = merge(self.required_keys, other.required_keys)
+    @classmethod
+    def merge_many(cls, dags):
+        # equivalent to folding merge() over the objsbykey, successors, etc. of
+        # every dag, but builds each of them once. nodes shared by identity
+        # are not merged again and successor sets are only copied when a
+        # later dag adds to them.
+        t = type(dags[0])
+        for d in dags[1:]:
+            t = select_type(t, type(d), DAG)
+
+        objsbykey = {}
+        for d in dags:
+            for k, v in d.objsbykey.items():
+                if k not in objsbykey:
+                    objsbykey[k] = v
+                elif objsbykey[k] is not v:
+                    objsbykey[k] = merge(objsbykey[k], v)
+
+        successors = {}
+        copied = {*[]}
+        for d in dags:
+            for k, v in d.successors.items():
+                cur = successors.get(k)
+                if cur is None:
+                    successors[k] = v
+                elif cur is v:
+                    continue
+                elif type(cur) is set and type(v) is set:
+                    if v <= cur:
+                        continue
+                    if k not in copied:
+                        cur = successors[k] = set(cur)
+                        copied.add(k)
+                    cur |= v
+                else:
+                    successors[k] = merge(cur, v)
+
+        prune_unreachable = dags[0].prune_unreachable
+        required_keys = dags[0].required_keys
+        for d in dags[1:]:
+            prune_unreachable = merge(prune_unreachable, d.prune_unreachable, coallesce_none=True)
+            required_keys = merge(required_keys, d.required_keys)
 
         return t(
             objsbykey=objsbykey,
             successors=successors,
             prune_unreachable=prune_unreachable,
             required_keys=required_keys,
+            chains=tuple(dict.fromkeys(c for d in dags for c in d.chains)),
         )
 
+    def _positions(self):
+        # the index of every key in each chain it is in. a key repeated in a
+        # chain comes after everything before its last occurrence
+        positions = {}
+        for n, chain in enumerate(self.chains):
+            for i, k in enumerate(chain):
+                positions.setdefault(k, {})[n] = i
+        return positions
+
+    def _successors(self):
+        # the successors of a key in sorted order, as sorting the full
+        # successor sets would, for toposort.sort only. keys before a key in a
+        # chain are sorted when the search reaches it, so the sets are never
+        # built. once the search is through a key, every key before it in its
+        # chains has been visited, and the search skips visited keys, so each
+        # chain keeps a mark below which keys are no longer yielded. that
+        # leaves most keys of a chain to be sorted and yielded about once,
+        # rather than once for every key after them.
+        positions = self._positions()
+        visited = [0] * len(self.chains)
+
+        def through(k):
+            for n, i in positions.get(k, {}).items():
+                visited[n] = max(visited[n], i + 1)
+
+        def before(n, pos):
+            start = visited[n]
+            for k, i in sorted(zip(self.chains[n][start:pos], range(start, pos))):
+                if i >= visited[n]:
+                    yield k
+
+        def successors(k):
+            sources = [before(n, pos) for n, pos in positions.get(k, {}).items()]
+            if k in self.successors:
+                sources.append(sorted(self.successors[k]))
+            for s, _ in itertools.groupby(heapq.merge(*sources)):
+                yield s
+                # the search only asks for the next successor once it is through s
+                if s != k:
+                    through(s)
+            through(k)
+
+        return successors
+
+    def _reachable(self, roots):
+        # toposort.reachable, marking how far into each chain keys have been
+        # reached rather than going through the keys before every key
+        positions = self._positions()
+        reached = [0] * len(self.chains)
+        seen = {*[]}
+        stack = list(roots)
+        while stack:
+            k = stack.pop()
+            found = list(self.successors.get(k, ()))
+            for n, i in positions.get(k, {}).items():
+                if i > reached[n]:
+                    found.extend(self.chains[n][reached[n] : i])
+                    reached[n] = i
+            for s in found:
+                if s not in seen:
+                    seen.add(s)
+                    stack.append(s)
+        return seen
+
     def finalize_to_list(self, prune_unreachable=None):
+        prune = prune_unreachable if prune_unreachable is not None else self.prune_unreachable
+        chain = self.chains[0] if len(self.chains) == 1 and not self.successors else ()
+        if len(chain) == len(self.objsbykey) and self.objsbykey.keys() == {*chain}:
+            # a single chain over every key is a total order, the sort would give it back as it is
+            order = list(chain)
+            if prune:
+                order = order[: max((i for i, k in enumerate(chain) if k in self.required_keys), default=0)]
+            return [self.objsbykey[k] for k in order]
+
         keys = sorted(self.objsbykey.keys())
-        order, visible = toposort.order(keys, lambda k: sorted(self.successors.get(k, {*[]})))
+        order = toposort.sort(keys, self._successors())
         order.reverse()
-        if prune_unreachable if prune_unreachable is not None else self.prune_unreachable:
-            accessible = {*[]}
-            for k in self.required_keys:
-                accessible.update(visible[k])
+        if prune:
+            accessible = self._reachable(self.required_keys)
             order = [k for k in order if k in accessible]
         return [self.objsbykey[k] for k in order]
 
     def __eq__(self, other) -> bool:
         if not isinstance(other, DAG):
             return NotImplemented
+        if self is other:
+            return True
+        # cheap checks first, comparing the nodes themselves is deep
         return (
-            self.objsbykey == other.objsbykey
-            and self.successors == other.successors
+            len(self.objsbykey) == len(other.objsbykey)
             and self.prune_unreachable == other.prune_unreachable
             and self.required_keys == other.required_keys
+            and self.successors == other.successors
+            and {*self.chains} == {*other.chains}
+            and self.objsbykey == other.objsbykey
         )
 
     @classmethod
@@ -84,15 +217,15 @@ class DAG(DefaultTags, Mergeable):
         # do not interact with each in unexpected ways, they'll be treated as
         # separate nodes where the key value is identical.
 
-        keys = [(key, v[key]) for v in values]
-        successors = {k: {*keys[:i]} for i, k in enumerate(keys)}
+        keys = tuple((key, v[key]) for v in values)
         objsbykey = {(key, v[key]): v for v in values}
         # set required_keys to all for assoclists, but don't set prune_unreachable
         # so if merged with something that sets prune_unreachable, then nothing is pruned...
-        return cls(objsbykey=objsbykey, successors=successors, required_keys={*keys})
+        return cls(objsbykey=objsbykey, successors={}, required_keys={*keys}, chains=(keys,))
 
 
 class NamedAssocList(DAG, DefaultTags):
+    __slots__ = ()
     yaml_tag = "!assocbyname"
 
     @classmethod
@@ -101,6 +234,7 @@ class NamedAssocList(DAG, DefaultTags):
 
 
 class IdAssocList(DAG, DefaultTags):
+    __slots__ = ()
     yaml_tag = "!assocbyid"
 
     @classmethod
@@ -109,6 +243,7 @@ class IdAssocList(DAG, DefaultTags):
 
 
 class MergeMaps(DefaultTags, dict):
+    __slots__ = ()
     yaml_tag = "!mergemap"
 
     @classmethod
@@ -123,7 +258,9 @@ class MergeMaps(DefaultTags, dict):
 
 
 class StrSet(DefaultTags, Mergeable, set):
+    __slots__ = ()
     yaml_tag = "!stringset"
+    symmetric = True
 
     @classmethod
     def from_yaml(cls, constructor, node):
@@ -131,6 +268,9 @@ class StrSet(DefaultTags, Mergeable, set):
 
     @classmethod
     def to_yaml(cls, representer, node):
+        if len(node) == 1:
+            # written as a plain string, styled as the representer styles those
+            return representer.represent_str(next(iter(node)))
         x = [representer.represent_str(i).value for i in node]
         return representer.represent_scalar("tag:yaml.org,2002:str", "\n".join(x), style="|" if len(x) > 1 else None)
 
@@ -1,10 +1,39 @@
+import bisect
+import functools
 import re
+from typing import Optional
 
 from .tags import DAG
 from .traverse import apply_children
 
+# the directive handlers below take select, an ItemFilter over the components
+
+
+def expand_repeat(select, obj, config):
+    render = compile_template(obj)
+    return [render(i) for i in select(config)]
+
+
+def insert_list(select, obj, config):
+    insert_key = config["insert_key"]
+    render = compile_template(config["insert_val"])
+    to_apply = select(config)
+    return type(obj)({**obj, insert_key: [render(i) for i in to_apply]})
+
+
+def insert_props(select, obj, cl):
+    renders = [(compile_template(c["insert_key"]), compile_template(c["insert_val"]), c) for c in cl]
+    return type(obj)(
+        {
+            **obj,
+            **{render_key(i): render_val(i) for render_key, render_val, config in renders for i in select(config)},
+        }
+    )
+
 
 def template_repeat(items, obj):
+    select = ItemFilter(items)
+
     def go(obj):
         if not isinstance(obj, list):
             return apply_children(obj, go)
@@ -15,45 +44,36 @@ def template_repeat(items, obj):
             return [go(obj)]
         config = obj.pop("__template_repeat", None)
         if config:
-            to_apply = filter_items(items, config)
-            return [apply_template(i, obj) for i in to_apply]
+            return expand_repeat(select, obj, config)
         return [go(obj)]
 
     return go(obj)
 
 
 def template_list(items, obj):
+    select = ItemFilter(items)
+
     def go(obj):
         if not isinstance(obj, dict):
             return apply_children(obj, go)
         config = obj.pop("__template_list", None)
         if config:
-            insert_key = config["insert_key"]
-            insert_val = config["insert_val"]
-            to_apply = filter_items(items, config)
-            return type(obj)({**obj, insert_key: [apply_template(i, insert_val) for i in to_apply]})
+            return insert_list(select, obj, config)
         return apply_children(obj, go)
 
     return go(obj)
 
 
 def template_props(items, obj):
+    select = ItemFilter(items)
+
     def go(obj):
         if not isinstance(obj, dict):
             return apply_children(obj, go)
         config = obj.pop("__template_props", None)
         cl = config_list(config)
         if cl:
-            return type(obj)(
-                {
-                    **obj,
-                    **{
-                        apply_template(i, config["insert_key"]): apply_template(i, config["insert_val"])
-                        for config in cl
-                        for i in filter_items(items, config)
-                    },
-                }
-            )
+            return insert_props(select, obj, cl)
         return apply_children(obj, go)
 
     return go(obj)
@@ -71,25 +91,111 @@ def config_list(config):
     raise TypeError(f"unexpected type {type(config)}")
 
 
+_compile = functools.lru_cache(maxsize=None)(re.compile)
+
+# characters that make a pattern more than a literal prefix
+_REGEX_SPECIAL = frozenset("\\.^$*+?{}[]|()")
+
+
+def literal_prefix(pattern: str) -> Optional[str]:
+    """the prefix that pattern matches with re.match, if it is only a literal prefix"""
+    if pattern.startswith("^"):
+        pattern = pattern[1:]
+    if _REGEX_SPECIAL.isdisjoint(pattern):
+        return pattern
+    return None
+
+
 def filter_items(items, obj):
     if isinstance(obj, dict):
         filter = obj.get("filter", None)
         if filter:
             key = filter["key"]
             match = filter["match"]
-            regex = re.compile(match)
+            regex = _compile(match)
             return [i for i in items if regex.match(i[key])]
     elif not isinstance(obj, bool):
         raise TypeError(f"Unexpected type for obj: {type(obj)}")
     return items
 
 
-def apply_template(templ, obj):
-    def go(obj):
-        if isinstance(obj, str):
-            return type(obj)(obj % templ)
-        elif isinstance(obj, dict):
-            return type(obj)({go(k): go(v) for k, v in obj.items()})
-        return apply_children(obj, go)
+class ItemFilter:
+    """filter_items over a fixed list of items, caching results per (key, pattern).
+
+    literal prefix patterns are answered by bisecting a sorted index of the
+    key's values instead of running the regex over every item. the items
+    must not be modified while the filter is in use.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self._results = {}
+        self._indexes = {}
+
+    def __call__(self, obj):
+        if isinstance(obj, dict):
+            filter = obj.get("filter", None)
+            if filter:
+                key = filter["key"]
+                match = filter["match"]
+                try:
+                    return self._results[key, match]
+                except KeyError:
+                    pass
+                res = self._match(key, match)
+                self._results[key, match] = res
+                return res
+        return filter_items(self.items, obj)
+
+    def _index(self, key):
+        if key not in self._indexes:
+            index = None
+            values = [i.get(key) if isinstance(i, dict) else None for i in self.items]
+            if all(isinstance(v, str) for v in values):
+                index = sorted((v, pos) for pos, v in enumerate(values))
+            self._indexes[key] = index
+        return self._indexes[key]
+
+    def _match(self, key, match):
+        prefix = literal_prefix(match) if isinstance(match, str) else None
+        index = self._index(key) if prefix is not None else None
+        if index is None:
+            # falls back to a scan, which also raises the same errors as filter_items
+            return filter_items(self.items, {"filter": {"key": key, "match": match}})
+        start = bisect.bisect_left(index, (prefix,))
+        positions = []
+        for j in range(start, len(index)):
+            value, pos = index[j]
+            if not value.startswith(prefix):
+                break
+            positions.append(pos)
+        positions.sort()
+        return [self.items[pos] for pos in positions]
+
+
+def compile_template(obj):
+    """analyse a template once, returning a function that renders it for an item.
+
+    render(templ) gives the same result as apply_template(templ, obj), but
+    strings without any % are not formatted again for every item.
+    """
+    if isinstance(obj, str):
+        t = type(obj)
+        if "%" not in obj:
+            if t is str:
+                return lambda templ: obj
+            return lambda templ: t(obj)
+        return lambda templ: t(obj % templ)
+    elif isinstance(obj, dict):
+        t = type(obj)
+        entries = [(compile_template(k), compile_template(v)) for k, v in obj.items()]
+        return lambda templ: t({k(templ): v(templ) for k, v in entries})
+    elif isinstance(obj, list):
+        t = type(obj)
+        entries = [compile_template(i) for i in obj]
+        return lambda templ: t([i(templ) for i in entries])
+    return lambda templ: obj
 
-    return go(obj)
+
+def apply_template(templ, obj):
+    return compile_template(obj)(templ)
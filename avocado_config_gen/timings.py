@@ -0,0 +1,106 @@
+import contextlib
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from typing import Optional
+
+# the record of the output being generated in this process, if timings are on
+_current = None
+
+
+class Record:
+    """the stages of generating one output, in the order they ran"""
+
+    def __init__(self, output):
+        self.output = output
+        self.stages = []
+        self.time = None
+
+    def to_dict(self) -> dict:
+        return {"output": self.output, "time": self.time, "stages": self.stages}
+
+
+def recording() -> bool:
+    """whether the stages of an output are being recorded in this process"""
+    return _current is not None
+
+
+@contextlib.contextmanager
+def stage(name: str, **info):
+    """time the block as a stage of the output being recorded, with its peak traced memory if tracing.
+
+    does nothing unless Timings.record() is active. peaks are the most
+    memory traced at once while the stage ran, including what was already
+    allocated before it. before python 3.9 peaks cannot be reset, so they
+    are the most traced since the output started.
+    """
+    record = _current
+    if record is None:
+        yield
+        return
+    tracing = tracemalloc.is_tracing()
+    if tracing and hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = {"stage": name, **info, "time": time.perf_counter() - start}
+        if tracing:
+            entry["peak"] = tracemalloc.get_traced_memory()[1]
+        record.stages.append(entry)
+
+
+class Timings:
+    """per output timings of each stage, as a json report.
+
+    with memory, allocations are traced while outputs are generated, which
+    slows every stage down, so only compare timings taken the same way.
+    with profile_dir, each output is also profiled to
+    <profile_dir>/<output>.prof, for pstats or snakeviz.
+    """
+
+    def __init__(self, *, memory: bool = True, profile_dir: Optional[str] = None):
+        self.memory = memory
+        self.profile_dir = profile_dir
+        self.records = []
+
+    @contextlib.contextmanager
+    def record(self, output):
+        """record the stages run in the block against output, yielding the Record"""
+        global _current
+        record = Record(output)
+        started = self.memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        profile = cProfile.Profile() if self.profile_dir else None
+        previous, _current = _current, record
+        start = time.perf_counter()
+        try:
+            if profile is not None:
+                profile.enable()
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            record.time = time.perf_counter() - start
+            _current = previous
+            if started:
+                tracemalloc.stop()
+        if profile is not None:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            name = output.strip(os.sep).replace(os.sep, "_")
+            profile.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+
+    def add(self, record: Record):
+        self.records.append(record)
+
+    def report(self) -> dict:
+        return {"outputs": [r.to_dict() for r in self.records]}
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+            f.write("\n")
@@ -1,27 +1,75 @@
 from .traverse import apply_children
 
 
-def order(nodes, successors):
+def _depth_first(nodes, successors, visible=None):
+    # an explicit stack is used so that long dependency chains do not hit the
+    # recursion limit. reachable sets are only tracked when visible is given.
     visited = {*[]}
-    visible = {}
-    output = []
-
-    def visit(n, root, onstack):
-        v = {*[]}
-        if n not in visited:
-            visited.add(n)
-            for i in successors(n):
-                if i in onstack:
+    postorder = []
+
+    for root in nodes:
+        if root in visited:
+            continue
+        visited.add(root)
+        if visible is not None:
+            visible[root] = {*[]}
+        onstack = {root}
+        stack = [(root, iter(successors(root)))]
+        while stack:
+            n, pending = stack[-1]
+            for i in pending:
+                if i in onstack and i != n:
                     raise ValueError("Cycle in dependencies. participating nodes: {} -> {}".format(n, i))
-                v = v | visit(i, root, onstack | {n})
-            output.insert(0, n)
-        visible[n] = visible.get(n, {*[]}) | v
-        return visible[n] | {n}
+                if i not in visited:
+                    visited.add(i)
+                    if visible is not None:
+                        visible[i] = {*[]}
+                    onstack.add(i)
+                    stack.append((i, iter(successors(i))))
+                    break
+                if visible is not None:
+                    visible[n] |= visible[i]
+                    visible[n].add(i)
+            else:
+                stack.pop()
+                onstack.discard(n)
+                postorder.append(n)
+                if stack and visible is not None:
+                    parent = stack[-1][0]
+                    visible[parent] |= visible[n]
+                    visible[parent].add(n)
+
+    postorder.reverse()
+    return postorder
 
-    for i in nodes:
-        visit(i, i, {*[]})
 
-    return output, visible
+def order(nodes, successors):
+    """depth first topological sort of nodes.
+
+    returns the nodes ordered so that every node precedes its successors,
+    along with a map from each node to the set of nodes reachable from it.
+    the map is quadratic in size on dense graphs, use sort and reachable
+    when the full closure is not needed.
+    """
+    visible = {}
+    return _depth_first(nodes, successors, visible), visible
+
+
+def sort(nodes, successors):
+    """the order from order(), without computing reachable sets"""
+    return _depth_first(nodes, successors)
+
+
+def reachable(roots, successors):
+    """the set of nodes reachable from roots by following at least one edge"""
+    seen = {*[]}
+    stack = list(roots)
+    while stack:
+        for i in successors(stack.pop()):
+            if i not in seen:
+                seen.add(i)
+                stack.append(i)
+    return seen
 
 
 def do_toposort(node, config):
@@ -45,17 +93,12 @@ def do_toposort(node, config):
         n.setdefault(id_to_key, key)
         return n
 
-    def keep_node(key, visible):
-        def isvisible(key):
-            return any([key in visible[i] for i in required])
-
-        if strip_unrequired:
-            return key in required or isvisible(key)
-        return True
-
-    sorted_nodes, visible = order(node.keys(), successors)
+    sorted_nodes = sort(node.keys(), successors)
     sorted_nodes.reverse()
-    return [output_node(i) for i in sorted_nodes if keep_node(i, visible)]
+    if strip_unrequired:
+        keep = required | reachable(required, successors)
+        sorted_nodes = [i for i in sorted_nodes if i in keep]
+    return [output_node(i) for i in sorted_nodes]
 
 
 def apply_toposort(obj):
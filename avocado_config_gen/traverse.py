@@ -1,6 +1,61 @@
+from ruamel.yaml.comments import Anchor, Comment, CommentedBase, Format, Tag, merge_attrib
+
+
 def apply_children(obj, func):
     if isinstance(obj, dict):
         return type(obj)(((k, func(v)) for k, v in obj.items()))
     elif isinstance(obj, list):
         return type(obj)([func(i) for i in obj])
     return obj
+
+
+def is_plain(obj) -> bool:
+    """whether obj carries no round-trip details that rebuilding it would drop.
+
+    apply_children loses comments, flow style, anchors, merge keys and tags
+    of the containers it rebuilds, so only containers without any of those
+    dump the same whether they are rebuilt or reused as they are.
+    """
+    if not isinstance(obj, CommentedBase):
+        return True
+    ca = getattr(obj, Comment.attrib, None)
+    if ca is not None and (ca.comment or ca.items or ca.end or ca.pre):
+        return False
+    fa = getattr(obj, Format.attrib, None)
+    if fa is not None and fa.flow_style():
+        return False
+    anchor = getattr(obj, Anchor.attrib, None)
+    if anchor is not None and anchor.value is not None:
+        return False
+    tag = getattr(obj, Tag.attrib, None)
+    if tag is not None and tag.value is not None:
+        return False
+    return not getattr(obj, merge_attrib, None)
+
+
+class Untouched:
+    """memoised check for subtrees a transform can return as they are.
+
+    a subtree qualifies when none of its dicts hold any of keys and all of
+    its containers are plain. results are cached by identity for the
+    lifetime of the index, which keeps the objects alive so ids stay valid.
+    """
+
+    def __init__(self, keys):
+        self.keys = keys
+        self._memo = {}
+
+    def __call__(self, obj) -> bool:
+        if not isinstance(obj, (dict, list)):
+            return True
+        cached = self._memo.get(id(obj))
+        if cached is not None:
+            return cached[1]
+        if not is_plain(obj):
+            res = False
+        elif isinstance(obj, dict):
+            res = not any(k in obj for k in self.keys) and all(self(v) for v in obj.values())
+        else:
+            res = all(self(v) for v in obj)
+        self._memo[id(obj)] = (obj, res)
+        return res
@@ -0,0 +1,41 @@
+import os
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+Stat = Optional[Tuple[int, int]]
+
+
+def snapshot(paths: Iterable[str]) -> Dict[str, Stat]:
+    res = {}
+    for p in paths:
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            res[p] = None
+        else:
+            res[p] = (st.st_mtime_ns, st.st_size)
+    return res
+
+
+class Watcher:
+    def __init__(self, paths: Iterable[str]):
+        self.stats = snapshot(paths)
+
+    def poll(self, paths: Iterable[str]) -> Set[str]:
+        """return the paths modified since the last poll.
+
+        paths not seen on a previous poll only start being tracked.
+        """
+        current = snapshot(paths)
+        changed = {p for p, s in current.items() if p in self.stats and self.stats[p] != s}
+        self.stats = current
+        return changed
+
+
+def watch(paths: Callable[[], Iterable[str]], on_change: Callable[[Set[str]], None], *, interval: float = 1.0):
+    watcher = Watcher(paths())
+    while True:
+        time.sleep(interval)
+        changed = watcher.poll(paths())
+        if changed:
+            on_change(changed)
@@ -0,0 +1,275 @@
+"""time every stage of a build on large synthetic configs.
+
+run with ``python -m benchmarks.suite`` from the repository root, which
+puts the package on the path. each scenario writes its inputs to a
+temporary directory, then loads, merges, transforms and dumps them as
+apply_single and dump_to_yaml do, timing each stage, and finally times
+run() over all of them. the best time of --repeat rounds is reported, and
+peak memory per stage is measured in a separate round with tracemalloc,
+which would skew the timings.
+
+results are compared against benchmarks/baseline.json, and the exit status
+is 1 when any of them is slower or larger than the baseline by more than
+--tolerance. --save writes the results as the new baseline. timings only
+compare on the same machine, refresh the baseline before relying on it.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from avocado_config_gen import combined_loader, create_yaml, dump_to_yaml, run
+from avocado_config_gen.merge import merge_all
+from avocado_config_gen.pipeline import transform
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STAGES = ("load", "merge", "transform", "dump")
+# differences smaller than these are noise, however large the ratio
+NOISE = {"time": 0.005, "peak": 2 ** 20}
+
+
+class AssocList(list):
+    # dumped as an !assocbyname sequence
+    pass
+
+
+def _yaml():
+    yaml = create_yaml()
+    # on this instance only, add_representer would add it to RoundTripRepresenter, for every YAML
+    representer = yaml.representer
+    representer.yaml_representers = {
+        **representer.yaml_representers,
+        AssocList: lambda r, data: r.represent_sequence("!assocbyname", data),
+    }
+    return yaml
+
+
+def components(n):
+    kinds = ("web", "worker", "db", "cache")
+    return [{"name": f"comp{i:04d}", "kind": kinds[i % len(kinds)], "port": 8000 + i} for i in range(n)]
+
+
+def overlays(rnd, scale):
+    # one large base document and many small overlays, each adding to a
+    # handful of services. merging does not override values, so overlays
+    # only add keys
+    services = 200 * scale
+    base = {
+        "services": {
+            f"svc{i:04d}": {
+                "image": f"registry/svc{i}:1.0",
+                "replicas": 1,
+                "env": {f"VAR_{j}": f"value-{i}-{j}" for j in range(10)},
+                "ports": [{"port": 80 + j, "protocol": "TCP"} for j in range(3)],
+            }
+            for i in range(services)
+        }
+    }
+    docs = [base]
+    for n in range(40):
+        docs.append(
+            {
+                "services": {
+                    f"svc{i:04d}": {"env": {f"OVERLAY_{n}": f"value-{n}"}, "labels": {f"overlay{n}": "true"}}
+                    for i in rnd.sample(range(services), 20)
+                }
+            }
+        )
+    return components(10), docs
+
+
+def assoclists(rnd, scale):
+    # large !assocbyname lists, overlays adding entries and adding to them
+    n = 1000 * scale
+    docs = []
+    for layer in range(5):
+        if layer == 0:
+            entries = ({"name": f"c{i:05d}", "image": f"img{i}:1", "args": ["--serve"]} for i in range(n))
+        else:
+            names = sorted(rnd.sample(range(n), n // 5))
+            entries = ({"name": f"c{i:05d}", f"layer{layer}": {"id": i}} for i in names)
+        docs.append({"containers": AssocList(entries)})
+    return components(10), docs
+
+
+def toposort(rnd, scale):
+    # a deep __toposort graph, nodes depend on a few nodes of the next layer
+    width, depth = 20, 50 * scale
+    jobs = {"__toposort": {"deps_key": "needs", "strip_unreachable": True, "required": ["j0000"], "id_to_key": "id"}}
+    for i in range(width * depth):
+        layer = i // width
+        needs = []
+        if layer < depth - 1:
+            needs = [f"j{j:04d}" for j in sorted(rnd.sample(range((layer + 1) * width, (layer + 2) * width), 3))]
+        jobs[f"j{i:04d}"] = {"needs": needs, "cmd": f"run {i}"}
+    jobs["j0000"]["needs"] = [f"j{j:04d}" for j in range(width)]
+    return components(10), [{"jobs": jobs}]
+
+
+def templates(rnd, scale):
+    # __template_repeat, __template_props and __template_list fanning out
+    # over many components
+    doc = {
+        "deployments": [
+            {
+                "__template_repeat": {"filter": {"key": "kind", "match": kind}},
+                "name": "%(name)s",
+                "spec": {"kind": "%(kind)s", "port": "%(port)s", "labels": {"app": "%(name)s", "tier": kind}},
+            }
+            for kind in ("web", "worker")
+        ]
+        + [{"__template_repeat": True, "name": "%(name)s-sidecar", "image": "sidecar:1"}],
+        "routes": {
+            "__template_props": [
+                {"insert_key": "route_%(name)s", "insert_val": {"host": "%(name)s.local", "port": "%(port)s"}},
+                {"filter": {"key": "kind", "match": "db"}, "insert_key": "db_%(name)s", "insert_val": "%(name)s"},
+            ]
+        },
+        "groups": {
+            f"group{g}": {"__template_list": {"insert_key": "members", "insert_val": "%(name)s-%(kind)s"}}
+            for g in range(20)
+        },
+    }
+    return components(500 * scale), [doc]
+
+
+SCENARIOS = {"overlays": overlays, "assoclists": assoclists, "toposort": toposort, "templates": templates}
+
+
+def write_inputs(root, scale, seed=0):
+    """write every scenario's inputs under root, returning a config item for each"""
+    yaml = _yaml()
+    config = []
+    for name, make in SCENARIOS.items():
+        comps, docs = make(random.Random(seed), scale)
+        paths = []
+        for i, doc in enumerate([comps, *docs]):
+            paths.append(os.path.join(root, f"{name}-{i}.yaml"))
+            with open(paths[-1], "w") as f:
+                yaml.dump(doc, f)
+        config.append({"output": os.path.join(root, f"{name}.out.yaml"), "components": paths[0], "from": paths[1:]})
+    return config
+
+
+def stages(item, yaml):
+    """run apply_single and dump_to_yaml one stage at a time, yielding each stage's name as it completes"""
+    components = combined_loader(item["components"], yaml=yaml)
+    data = [combined_loader(p, yaml=yaml) for p in item["from"]]
+    yield "load"
+    data = merge_all(data)
+    yield "merge"
+    data = transform(components, data)
+    yield "transform"
+    # the output is removed first, so every round writes it
+    if os.path.exists(item["output"]):
+        os.unlink(item["output"])
+    dump_to_yaml(item["output"], data, yaml=yaml)
+    yield "dump"
+
+
+def time_stages(item, yaml):
+    times = {}
+    start = time.perf_counter()
+    for stage in stages(item, yaml):
+        now = time.perf_counter()
+        times[stage] = now - start
+        start = now
+    return times
+
+
+def peak_stages(item, yaml):
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for stage in stages(item, yaml):
+            peaks[stage] = tracemalloc.get_traced_memory()[1]
+            # before python 3.9 peaks are cumulative over the stages
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def time_run(config, yaml):
+    for item in config:
+        if os.path.exists(item["output"]):
+            os.unlink(item["output"])
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(config, kont=dump_to_yaml, yaml=yaml)
+    return time.perf_counter() - start
+
+
+def measure(config, *, repeat=3, memory=True):
+    yaml = create_yaml()
+    results = {}
+    for item in config:
+        name = os.path.basename(item["output"]).split(".")[0]
+        times = {}
+        for _ in range(repeat):
+            gc.collect()
+            for stage, t in time_stages(item, yaml).items():
+                times[stage] = min(times.get(stage, t), t)
+        results[name] = {f"{stage}.time": times[stage] for stage in STAGES}
+        if memory:
+            gc.collect()
+            results[name].update({f"{stage}.peak": peak for stage, peak in peak_stages(item, yaml).items()})
+    results["run"] = {"total.time": min(time_run(config, yaml) for _ in range(repeat))}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """lines reporting each result against the baseline, and whether any regressed beyond tolerance"""
+    lines, regressed = [], False
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            ratio = value / base if base else None
+            bad = ratio is not None and ratio > tolerance and value - base > NOISE[metric.split(".")[1]]
+            regressed |= bad
+            shown = f"{value * 1000:10.1f}ms" if metric.endswith(".time") else f"{value / 2**20:10.1f}MB"
+            vs = f"{ratio:6.2f}x" if ratio is not None else "     -"
+            lines.append(f"{name:>12} {metric:<16} {shown} {vs}{'  REGRESSED' if bad else ''}")
+    return lines, regressed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", default=True)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--save", action="store_true", default=False)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as root:
+        results = measure(write_inputs(root, args.scale), repeat=args.repeat, memory=args.memory)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        # inputs of another scale are not comparable
+        if saved["scale"] == args.scale:
+            baseline = saved["results"]
+    lines, regressed = compare(results, baseline, args.tolerance)
+    print("\n".join(lines))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"scale": args.scale, "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+    return 1 if regressed and not args.save else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
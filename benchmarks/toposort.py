@@ -0,0 +1,54 @@
+"""time toposort.order on large synthetic graphs.
+
+run with ``python -m benchmarks.toposort`` from the repository root, which
+puts the package on the path. each graph size doubles, so a linear
+implementation shows per-node times that stay flat as it grows.
+"""
+import random
+import sys
+import time
+
+from avocado_config_gen.toposort import order
+
+
+def layered_graph(n, *, width=25, depth=4, fanout=3, seed=0):
+    # nodes form independent groups of `depth` layers with edges into the
+    # next layer only, keeping reachable sets bounded so the sort itself
+    # dominates rather than the size of the closure
+    rnd = random.Random(seed)
+    graph = {}
+    for i in range(n):
+        group, pos = divmod(i, width * depth)
+        layer = pos // width
+        if layer == depth - 1:
+            graph[i] = []
+            continue
+        lo = group * width * depth + (layer + 1) * width
+        hi = min(lo + width, n)
+        graph[i] = rnd.sample(range(lo, hi), min(fanout, max(hi - lo, 0)))
+    return graph
+
+
+def chain_graph(n):
+    return {i: [i + 1] if i + 1 < n else [] for i in range(n)}
+
+
+def bench(name, graph):
+    keys = sorted(graph)
+    start = time.perf_counter()
+    order(keys, graph.__getitem__)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8} {len(graph):>8} nodes {elapsed * 1000:>9.1f}ms {elapsed / len(graph) * 1e6:>7.2f}us/node")
+
+
+def main(argv):
+    sizes = [int(i) for i in argv] or [10_000, 20_000, 40_000, 80_000]
+    for n in sizes:
+        bench("layered", layered_graph(n))
+    # chains have quadratic reachable sets, keep them smaller
+    for n in sizes:
+        bench("chain", chain_graph(n // 10))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
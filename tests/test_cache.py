@@ -0,0 +1,89 @@
+import os
+
+from avocado_config_gen import load_file
+from avocado_config_gen.cache import DiskCache, FileCache
+from avocado_config_gen.tags import IdAssocList, NamedAssocList, SetList, StrSet
+
+
+def test_file_cache_parses_once(tmp_path):
+    path = tmp_path / "input.yaml"
+    path.write_text("foo:\n  bar: 1\n")
+    calls = []
+
+    def loader(p, *, yaml=None):
+        calls.append(p)
+        return load_file(p, yaml=yaml)
+
+    cache = FileCache(loader)
+    first = cache(str(path))
+    second = cache(str(path))
+    assert calls == [str(path)]
+    assert first == second == {"foo": {"bar": 1}}
+    # callers get their own copy as transforms mutate their inputs
+    first["foo"].pop("bar")
+    assert cache(str(path)) == {"foo": {"bar": 1}}
+
+
+def test_file_cache_reloads_changed_file(tmp_path):
+    path = tmp_path / "input.yaml"
+    path.write_text("foo: 1\n")
+    cache = FileCache(load_file)
+    assert cache(str(path)) == {"foo": 1}
+    path.write_text("foo: 22\n")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert cache(str(path)) == {"foo": 22}
+
+
+def test_disk_cache_roundtrip(tmp_path):
+    path = tmp_path / "input.yaml"
+    path.write_text(
+        """
+    names: !assocbyname
+    - name: b
+    - name: a
+    ids: !assocbyid
+    - id: 1
+    set: !set [a, b]
+    strings: !stringset [x]
+    merged: !mergemap
+    - {a: 1}
+    - {a: 2, b: 3}
+    """
+    )
+    cache_dir = tmp_path / "cache"
+    calls = []
+
+    def loader(p, *, yaml=None):
+        calls.append(p)
+        return load_file(p, yaml=yaml)
+
+    expected = load_file(str(path))
+    assert DiskCache(loader, str(cache_dir))(str(path)) == expected
+    # a fresh instance, as in a new invocation, is served from disk
+    cached = DiskCache(loader, str(cache_dir))(str(path))
+    assert len(calls) == 1
+    assert cached == expected
+    assert type(cached["names"]) is NamedAssocList
+    assert type(cached["ids"]) is IdAssocList
+    assert type(cached["set"]) is SetList
+    assert type(cached["strings"]) is StrSet
+    assert cached["names"].finalize_to_list() == [{"name": "b"}, {"name": "a"}]
+
+
+def test_disk_cache_eviction(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache = DiskCache(load_file, str(cache_dir), max_bytes=0)
+    for i in range(3):
+        path = tmp_path / f"input{i}.yaml"
+        path.write_text(f"foo: {i}\n")
+        assert cache(str(path)) == {"foo": i}
+    assert not list(cache_dir.glob("*" + DiskCache.suffix))
+
+
+def test_disk_cache_key_file(tmp_path):
+    cache = DiskCache(load_file, str(tmp_path / "cache"))
+    for content in [b"", b"foo: 1\n", b"x" * (1 << 20) + b"\n"]:
+        path = tmp_path / "input.yaml"
+        path.write_bytes(content)
+        assert cache.key_file(str(path)) == cache.key(content)
@@ -1,9 +1,26 @@
+import os
+import time
+
 import pytest
 from mockify import satisfied
 from mockify.actions import Return
 from mockify.mock import Mock
 
-from avocado_config_gen import all_files, combined_loader, run
+from avocado_config_gen import (
+    Generator,
+    all_files,
+    apply_single,
+    combined_loader,
+    create_yaml,
+    dump_to_yaml,
+    dumps_yaml,
+    item_dependencies,
+    load_file,
+    main,
+    run,
+    stream_to_yaml,
+)
+from avocado_config_gen.pipeline import transform, transform_entries
 
 
 class File(str):
@@ -81,3 +98,165 @@ def test_all_files():
         {"yaml": '"some yaml"'},
     ]
     assert all_files(data) == {"/path/to/file.yaml", "/another/file.yaml"}
+
+
+def _apply_stub(components, output, files, *, yaml=None):
+    if "fail" in output:
+        raise ValueError(f"failed {output}")
+    return {"components": components, "from": files, "has_yaml": yaml is not None}
+
+
+def test_run_parallel(tmp_path, capsys):
+    config = [
+        {"output": str(tmp_path / f"output{i}.yaml"), "components": "foo.yaml", "from": [f"input_{i}.yaml"]}
+        for i in range(4)
+    ]
+    run(config, kont=dump_to_yaml, apply=_apply_stub, yaml=create_yaml(), jobs=2)
+    # logging stays in config order
+    assert capsys.readouterr().out.splitlines() == [
+        *(f"generating {i['output']}..." for i in config),
+        "4 written, 0 unchanged",
+    ]
+    for i in config:
+        assert load_file(i["output"]) == {"components": "foo.yaml", "from": i["from"], "has_yaml": True}
+
+
+def test_run_parallel_first_error(tmp_path):
+    config = [
+        {"output": str(tmp_path / name), "components": "foo.yaml", "from": []}
+        for name in ["ok.yaml", "fail1.yaml", "fail2.yaml"]
+    ]
+    with pytest.raises(ValueError, match="failed .*fail1.yaml"):
+        run(config, kont=dump_to_yaml, apply=_apply_stub, jobs=2)
+
+
+@pytest.mark.parametrize("stale", [False, True])
+def test_run_parallel_chained(tmp_path, monkeypatch, stale):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "components.yaml").write_text("- name: a\n")
+    (tmp_path / "input.yaml").write_text("a: 1\n")
+    if stale:
+        (tmp_path / "out1.yaml").write_text("a: 0\n")
+    # out3 reads out2, which reads out1, out4 is independent
+    (tmp_path / ".template-config.yaml").write_text(
+        """
+        - {output: out1.yaml, components: components.yaml, from: [input.yaml, {value: {b: 1}}]}
+        - {output: out2.yaml, components: components.yaml, from: [out1.yaml, {value: {c: 1}}]}
+        - {output: out3.yaml, components: components.yaml, from: [{path: out2.yaml, extract_from: c}]}
+        - {output: out4.yaml, components: components.yaml, from: [input.yaml]}
+        """
+    )
+    main(["-j", "2"])
+    assert load_file("out2.yaml") == {"a": 1, "b": 1, "c": 1}
+    assert load_file("out3.yaml") == 1
+    assert load_file("out4.yaml") == {"a": 1}
+
+
+def test_item_dependencies():
+    config = [
+        {"output": "out1.yaml", "components": "c.yaml", "from": ["out3.yaml"]},
+        {"output": "out2.yaml", "components": "c.yaml", "from": [{"path": "./out1.yaml"}]},
+        {"output": "out3.yaml", "components": "c.yaml", "from": ["in.yaml"]},
+        {"output": "out2.yaml", "components": "c.yaml", "from": ["out2.yaml"]},
+    ]
+    # out3 waits for out1 to read it, the second out2 for the first one and its own reads
+    assert item_dependencies(config) == [set(), {0}, {0}, {1}]
+
+
+def _apply_reading(components, output, files, *, yaml=None):
+    # the item reading an output of a later item is slow, so the later one would replace it first
+    if "slow" in output:
+        time.sleep(0.5)
+    return {"read": [load_file(f) for f in files]}
+
+
+def test_run_parallel_backward_reference(tmp_path):
+    (tmp_path / "out.yaml").write_text("old: 1\n")
+    config = [
+        {"output": str(tmp_path / "slow.yaml"), "components": "c.yaml", "from": [str(tmp_path / "out.yaml")]},
+        {"output": str(tmp_path / "out.yaml"), "components": "c.yaml", "from": []},
+    ]
+    run(config, kont=dump_to_yaml, apply=_apply_reading, jobs=2)
+    # as run_serial, the earlier item reads the file before the later one replaces it
+    assert load_file(config[0]["output"]) == {"read": [{"old": 1}]}
+    assert load_file(config[1]["output"]) == {"read": []}
+
+
+def test_dump_to_yaml_skips_unchanged(tmp_path):
+    output = tmp_path / "output.yaml"
+    assert dump_to_yaml(str(output), {"foo": 1}) is True
+    os.chmod(output, 0o640)
+    st = os.stat(output)
+    os.utime(output, ns=(st.st_atime_ns, st.st_mtime_ns - 1_000_000_000))
+    mtime = os.stat(output).st_mtime_ns
+
+    assert dump_to_yaml(str(output), {"foo": 1}) is False
+    assert os.stat(output).st_mtime_ns == mtime
+
+    assert dump_to_yaml(str(output), {"foo": 2}) is True
+    assert load_file(str(output)) == {"foo": 2}
+    assert os.stat(output).st_mode & 0o777 == 0o640
+    assert [p.name for p in tmp_path.iterdir()] == ["output.yaml"]
+
+
+@pytest.mark.parametrize(
+    "doc",
+    [
+        "a: 1\nb:\n  c: !set [2, 1]\n  d: [x, y]  # comment\n",
+        "- __template_repeat: true\n  id: '%(name)s'\n- {flow: true}\n",
+        "__template_list:\n  insert_key: n\n  insert_val: '%(name)s'\n",
+        "{}",
+        "1",
+        # keep chomped scalars end each chunk with a document end marker
+        "a: |+\n  x\n\nb: 1\n",
+        "- |+\n  x\n\n- 1\n- |+\n  y\n\n",
+    ],
+)
+def test_stream_to_yaml(tmp_path, doc):
+    yaml = create_yaml()
+    items = [{"name": "a"}, {"name": "b"}]
+    whole, streamed = tmp_path / "whole.yaml", tmp_path / "streamed.yaml"
+    dump_to_yaml(str(whole), transform(items, yaml.load(doc)), yaml=yaml)
+    assert stream_to_yaml(str(streamed), transform_entries(items, yaml.load(doc)), yaml=yaml, chunk=1) is True
+    assert streamed.read_text() == whole.read_text()
+    assert load_file(str(streamed)) == load_file(str(whole))
+
+    assert stream_to_yaml(str(streamed), transform_entries(items, yaml.load(doc)), yaml=yaml) is False
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["streamed.yaml", "whole.yaml"]
+
+
+def test_run_reports_unchanged(tmp_path, capsys):
+    config = [{"output": str(tmp_path / "output.yaml"), "components": "foo.yaml", "from": []}]
+    run(config, kont=dump_to_yaml, apply=_apply_stub)
+    run(config, kont=dump_to_yaml, apply=_apply_stub)
+    assert capsys.readouterr().out.splitlines()[-1] == "0 written, 1 unchanged"
+
+
+def test_generator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "components.yaml").write_text("- name: a\n- name: b\n")
+    (tmp_path / "input.yaml").write_text("items:\n- __template_repeat: true\n  id: '%(name)s'\n")
+    (tmp_path / ".template-config.yaml").write_text(
+        """
+        - output: out1.yaml
+          components: components.yaml
+          from: [input.yaml]
+        - output: out2.yaml
+          components: components.yaml
+          from: [input.yaml, {value: {jobs: {__toposort: {deps_key: d, strip_unreachable: false, id_to_key: id}, x: {}}}}]
+        """
+    )
+    gen = Generator()
+    expected = apply_single("components.yaml", "out1.yaml", ["input.yaml"])
+    assert gen.generate("out1.yaml") == expected
+    assert dumps_yaml(gen.generate("out1.yaml"), yaml=gen.yaml) == dumps_yaml(expected)
+    # inline values are not consumed by the first generation
+    assert [k for k, _ in gen.generate_all()] == ["out1.yaml", "out2.yaml"]
+    assert gen.generate("out2.yaml") == {**expected, "jobs": [{"id": "x"}]}
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".template-config.yaml", "components.yaml", "input.yaml"]
+
+    # inputs are reparsed once they change
+    (tmp_path / "components.yaml").write_text("- name: c\n")
+    assert gen.generate("out1.yaml") == {"items": [{"id": "c"}]}
+    with pytest.raises(KeyError):
+        gen.generate("missing.yaml")
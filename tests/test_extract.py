@@ -0,0 +1,139 @@
+import copy
+import io
+
+import pytest
+
+from avocado_config_gen import combined_loader, create_yaml, load_file
+from avocado_config_gen.extract import Extractor
+
+DOC = """\
+# leading
+services:
+  payments:
+    image: pay:1  # pinned
+    env: {A: 1, B: "two"}
+    ports:
+    - 80
+    - 443
+
+  # comment before orders
+  orders: &orders
+    containers: !assocbyname
+      - name: app
+        args: [--serve]
+      - name: sidecar
+    script: |
+      line one
+      line two
+  'quoted': folded
+  1: not a str key
+  refs:
+    <<: *orders
+    extra: 1
+  aliased: *orders
+  ünïcode: ✓
+settings:
+  deep: {a: {b: {c: [1, 2]}}}
+"""
+
+PATHS = [
+    "services",
+    "services/payments",
+    "services/payments/env",
+    "services/orders",
+    "services/orders/containers",
+    "services/orders/script",
+    "services/quoted",
+    "services/refs",
+    "services/aliased",
+    "services/ünïcode",
+    "settings/deep/a/b",
+]
+
+
+def _dump(data):
+    buf = io.StringIO()
+    create_yaml().dump({"data": data}, buf)
+    return buf.getvalue()
+
+
+def _expected(path, extract_from):
+    data = load_file(path)
+    for k in extract_from.split("/"):
+        data = data[k]
+    # FileCache hands out copies, which is what combined_loader sees
+    return copy.deepcopy(data)
+
+
+@pytest.mark.parametrize("expect", [False, True])
+def test_extract_matches_full_load(tmp_path, expect):
+    path = tmp_path / "doc.yaml"
+    path.write_text(DOC)
+    extractor = Extractor(load_file)
+    if expect:
+        extractor.expect({"path": str(path), "extract_from": p} for p in PATHS)
+    yaml = create_yaml()
+    for p in PATHS:
+        assert _dump(extractor(str(path), p, yaml=yaml)) == _dump(_expected(str(path), p))
+
+
+@pytest.mark.parametrize(
+    ("doc", "extract_from"),
+    [
+        # keys through merge keys, tags or duplicates are found by loading in full
+        ("base: &b {x: {y: 1}}\nm:\n  <<: *b\n", "m/x"),
+        ("m: !mergemap\n- {a: {b: 1}}\n- {c: 2}\n", "m/a"),
+        ("a: {b: 1}\na: {b: 2}\n", "a/b"),
+        ("%YAML 1.1\n---\na: {b: yes}\n", "a/b"),
+        ("a: [1, 2]\n", "a/0"),
+        ("a: {b: 1}\n", "a/c"),
+        ("a: {b: 1}\n", "a/b/c"),
+        ("", "a"),
+    ],
+)
+def test_extract_falls_back(tmp_path, doc, extract_from):
+    path = tmp_path / "doc.yaml"
+    path.write_text(doc)
+    calls = []
+
+    def loader(p, *, yaml=None):
+        calls.append(p)
+        return load_file(p, yaml=yaml)
+
+    extractor = Extractor(loader)
+    try:
+        expected = _dump(_expected(str(path), extract_from))
+    except Exception as e:
+        with pytest.raises(type(e)):
+            extractor(str(path), extract_from, yaml=create_yaml())
+    else:
+        assert _dump(extractor(str(path), extract_from, yaml=create_yaml())) == expected
+    assert calls == [str(path)]
+
+
+def test_extract_scans_once(tmp_path):
+    path = tmp_path / "doc.yaml"
+    path.write_text(DOC)
+    extractor = Extractor(load_file)
+    extractor.expect([{"path": str(path), "extract_from": p} for p in PATHS[1:3]])
+    yaml = create_yaml()
+    first = extractor(str(path), "services/payments", yaml=yaml)
+    # siblings expected together come from the same scan
+    entries = dict(extractor._entries)
+    assert extractor(str(path), "services/payments/env", yaml=yaml) == {"A": 1, "B": "two"}
+    assert extractor._entries == entries
+    # callers get their own copy
+    first.pop("image")
+    assert "image" in extractor(str(path), "services/payments", yaml=yaml)
+
+    path.write_text("services:\n  payments: changed\n")
+    assert extractor(str(path), "services/payments", yaml=yaml) == "changed"
+
+
+def test_combined_loader_extract_loader(tmp_path):
+    path = tmp_path / "doc.yaml"
+    path.write_text(DOC)
+    config = {"path": str(path), "extract_from": "settings/deep", "prefix_at": "x"}
+    extractor = Extractor(load_file)
+    assert combined_loader(config, extract_loader=extractor) == combined_loader(config)
+    assert combined_loader(config, extract_loader=extractor) == {"x": {"a": {"b": {"c": [1, 2]}}}}
@@ -0,0 +1,115 @@
+import functools
+
+import pytest
+from ruamel.yaml import YAML
+from ruamel.yaml.constructor import ConstructorError
+from ruamel.yaml.representer import SafeRepresenter
+
+from avocado_config_gen import apply_single, combined_loader, create_yaml, dump_to_yaml, load_file
+from avocado_config_gen.fastload import create_fast_loader, load_file_fast
+from avocado_config_gen.tags import SetList
+
+COMPONENTS = """\
+- name: a
+  kind: web
+- name: b
+  kind: db
+- name: c
+  kind: web
+"""
+
+# the documents of the other test modules, as inputs to a whole run
+CASES = {
+    "tags": [
+        "foo: !set [a]\nnamed: !assocbyname\n- name: 1\n- name: 2\nids: !assocbyid\n- id: 1\n",
+        "foo: !set [b]\nnamed: !assocbyname\n- name: 2\n- name: 3\n  x: {y: 1}\nstrs: !stringset [hello]\n",
+        "merged: !mergemap\n- a: 1\n  b: 2\n- a: 2\n  d: 4\n",
+    ],
+    "templates": [
+        """\
+services:
+- __template_repeat:
+    filter: {key: kind, match: web}
+  id: "%(name)s"
+  port: 80
+- id: static
+props:
+  __template_props:
+    insert_key: "%(name)s_enabled"
+    insert_val: true
+list:
+  __template_list:
+    insert_key: names
+    insert_val: "%(name)s"
+""",
+    ],
+    "toposort": [
+        """\
+steps:
+  __toposort:
+    deps_key: needs
+    strip_unreachable: false
+    id_to_key: id
+  build: {needs: [fetch]}
+  fetch: {}
+  test:
+    needs: build
+""",
+        "steps:\n  deploy:\n    needs: [test]\n",
+    ],
+    "styles": [
+        """\
+base: &base
+  image: app
+  ports: [80, 443]
+web:
+  <<: *base
+  replicas: 2
+script: |
+  set -e
+  make
+quoted: "it's"
+nothing:
+numbers: [1, 2.5, -3, .inf]
+flow: {a: [1, 2]}
+strings: [yes, "1", "", "a: b", "~"]
+date: 2020-01-01
+""",
+        "web:\n  env: prod\n",
+    ],
+}
+
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_fast_load_generates_identical_outputs(tmp_path, case):
+    (tmp_path / "components.yaml").write_text(COMPONENTS)
+    files = []
+    for i, doc in enumerate(CASES[case]):
+        (tmp_path / f"{i}.yaml").write_text(doc)
+        files.append(str(tmp_path / f"{i}.yaml"))
+
+    outputs = []
+    for file_loader in (load_file, load_file_fast):
+        output = str(tmp_path / f"{file_loader.__name__}.yaml")
+        loader = functools.partial(combined_loader, file_loader=file_loader)
+        yaml = create_yaml()
+        dump_to_yaml(output, apply_single(str(tmp_path / "components.yaml"), output, files, loader=loader, yaml=yaml))
+        with open(output) as f:
+            outputs.append(f.read())
+    assert outputs[0] == outputs[1]
+
+
+def test_fast_load_merge_keys(tmp_path):
+    doc = "a: &a {x: 1, y: 2}\nb: &b {y: 3, z: 4}\nc:\n  w: 0\n  <<: [*b, *a]\n  x: 9\n"
+    (tmp_path / "doc.yaml").write_text(doc)
+    expected = load_file(str(tmp_path / "doc.yaml"))
+    res = load_file_fast(str(tmp_path / "doc.yaml"))
+    assert list(res["c"].items()) == list(expected["c"].items()) == [("w", 0), ("x", 9), ("y", 3), ("z", 4)]
+    assert type(res["c"]) is dict
+
+
+def test_fast_loader_does_not_register_tags_globally():
+    create_fast_loader()
+    with pytest.raises(ConstructorError):
+        YAML(typ="safe", pure=False).load("!set [a]\n")
+    assert SetList not in SafeRepresenter.yaml_representers
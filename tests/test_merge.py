@@ -1,7 +1,8 @@
 import pytest
 
 from avocado_config_gen import create_yaml
-from avocado_config_gen.merge import Mergeable, merge
+from avocado_config_gen.fingerprint import Fingerprints
+from avocado_config_gen.merge import Mergeable, NonCommutativeMergeError, NonMergeableTypesError, merge, merge_all
 
 
 class Left(Mergeable, dict):
@@ -86,3 +87,62 @@ def test_merge_complex_keys():
     assert len(r) == 1
     assert list(r.values())[0] == {"foo": 1, "bar": 2}
     assert list(r.keys())[0] == {"key": "hello"}
+
+
+def test_merge_all_matches_pairwise_merge():
+    yaml = create_yaml()
+    items = [
+        yaml.load("a: {x: 1}\nb: !set [1]\n"),
+        {"a": {"y": 2}, "c": 3},
+        {"b": {2}, "a": {"x": 1, "z": {"deep": True}}},
+        Left({"ignored": True}),
+        {"d": [1]},
+    ]
+    expected = merge(merge(merge(merge(items[0], items[1]), items[2]), items[3]), items[4])
+    res = merge_all(items)
+    assert res == expected
+    assert list(res) == list(expected)
+    assert type(res) is type(expected)
+
+    fragments = [{"top": {f"k{i}": i, "shared": {"v": 1}}} for i in range(50)]
+    res = merge_all(fragments)
+    assert res == {"top": {**{f"k{i}": i for i in range(50)}, "shared": {"v": 1}}}
+    assert list(res["top"]) == ["k0", "shared", *(f"k{i}" for i in range(1, 50))]
+
+
+@pytest.mark.parametrize(
+    ("items", "error"),
+    [
+        ([{"a": 1}, {"b": 1}, {"a": 2}], NonMergeableTypesError),
+        ([{"a": {"b": 1}}, {"a": 1}], NonMergeableTypesError),
+        ([{"a": Left({})}, {"a": Left({"x": 1})}], NonCommutativeMergeError),
+        ([], ValueError),
+    ],
+)
+def test_merge_all_errors(items, error):
+    with pytest.raises(error):
+        merge_all(items)
+
+
+def test_merge_all_fingerprints():
+    yaml = create_yaml()
+    shared = {"x": [1, {"y": 2}], "z": None}
+    items = [
+        {"a": dict(shared), "b": 1},
+        {"a": dict(shared), "c": {"d": 1.5}},
+        {"a": dict(shared), "c": {"d": 1.5, "e": 1}},
+    ]
+    fingerprints = Fingerprints()
+    res = merge_all(items, same=fingerprints.same)
+    assert res == merge_all(items)
+    # repeated subtrees are taken from the first item as they are
+    assert res["a"] is items[0]["a"]
+
+    assert fingerprints.same({"a": 1}, {"a": 1})
+    assert not fingerprints.same({"a": 1}, {"a": True})
+    assert not fingerprints.same({"a": 1, "b": 2}, {"b": 2, "a": 1})
+    assert not fingerprints.same({"a": float("nan")}, {"a": float("nan")})
+    assert not fingerprints.same({"a": {1}}, {"a": {1}})
+    # rebuilding would drop the comment, so it is not taken as it is either
+    commented = yaml.load("a: 1  # comment\n")
+    assert not fingerprints.same(commented, yaml.load("a: 1  # comment\n"))
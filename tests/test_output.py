@@ -0,0 +1,90 @@
+import io
+import json
+
+import pytest
+from ruamel.yaml import YAML
+from ruamel.yaml.constructor import ConstructorError
+
+from avocado_config_gen import create_yaml, dump_to_json, dump_to_yaml, dump_to_yaml_fast
+from avocado_config_gen.output import create_fast_yaml, dumps_json
+from avocado_config_gen.tags import StrSet
+
+DOC = """\
+plain:
+  str: value
+  quoted: "it's: quoted"
+  multiline: "a\\nb"
+  literal: |
+    text
+  number: 1
+  float: 1.50
+  hex: 0x1F
+  underscored: 1_000
+  bool: true
+  none:
+  empty: {}
+flow: {a: [1, 2]}
+set: !set [3, 1, 2]
+assoc: !assocbyname
+- name: b
+  value: 2
+- name: a
+merged: !mergemap
+- a: 1
+- b: 2
+"""
+
+
+def _dump(yaml, data):
+    buf = io.StringIO()
+    yaml.dump(data, buf)
+    return buf.getvalue()
+
+
+def test_fast_yaml_matches_round_trip():
+    yaml = create_yaml()
+    data = yaml.load(DOC)
+    assert _dump(create_fast_yaml(), data) == _dump(yaml, data)
+    for value in ["x", "a\nb", "it's: quoted"]:
+        single = {"s": StrSet([value])}
+        assert _dump(create_fast_yaml(), single) == _dump(yaml, single)
+
+
+def test_fast_yaml_long_words():
+    # words longer than the line width get a line of their own from create_yaml() only
+    data = {"url": "https://example.com/" + "p" * 90}
+    assert _dump(create_yaml(), data) == f"url: \n  {data['url']}\n"
+    assert _dump(create_fast_yaml(), data) == f"url: {data['url']}\n"
+    assert create_yaml().load(_dump(create_fast_yaml(), data)) == data
+
+
+def test_fast_yaml_does_not_register_tags_globally():
+    create_fast_yaml()
+    with pytest.raises(ConstructorError):
+        YAML(typ="safe", pure=False).load("!set [a]\n")
+
+
+def test_dumps_json():
+    data = create_yaml().load(DOC)
+    data["strset"] = StrSet(["b", "a"])
+    res = json.loads(dumps_json(data))
+    assert res["plain"]["bool"] is True
+    assert res["plain"]["hex"] == 31
+    assert res["plain"]["none"] is None
+    assert res["set"] == [1, 2, 3]
+    assert res["assoc"] == [{"name": "b", "value": 2}, {"name": "a"}]
+    assert res["merged"] == {"a": 1, "b": 2}
+    assert res["strset"] == "a\nb"
+
+
+@pytest.mark.parametrize("kont", [dump_to_yaml_fast, dump_to_json])
+def test_dump_formats(tmp_path, kont):
+    output = str(tmp_path / "output")
+    data = create_yaml().load(DOC)
+    assert kont(output, data) is True
+    assert kont(output, data) is False
+    with open(output) as f:
+        assert create_yaml().load(f) == json.loads(dumps_json(data))
+    if kont is dump_to_yaml_fast:
+        dump_to_yaml(str(tmp_path / "expected"), data)
+        assert (tmp_path / "expected").read_text() == (tmp_path / "output").read_text()
@@ -0,0 +1,117 @@
+import copy
+import io
+
+import pytest
+
+from avocado_config_gen import create_yaml
+from avocado_config_gen.pipeline import transform
+from avocado_config_gen.tags import DAG
+from avocado_config_gen.template import template_list, template_props, template_repeat
+from avocado_config_gen.toposort import apply_toposort
+
+COMPONENTS = [
+    {"name": "a", "kind": "web"},
+    {"name": "b", "kind": "db"},
+    {"name": "c", "kind": "web"},
+]
+
+
+def _sequential(items, obj):
+    return template_props(items, template_list(items, template_repeat(items, apply_toposort(obj))))
+
+
+def _assert_same(obj):
+    expected = _sequential(copy.deepcopy(COMPONENTS), copy.deepcopy(obj))
+    res = transform(copy.deepcopy(COMPONENTS), copy.deepcopy(obj))
+    assert res == expected
+    assert repr(res) == repr(expected)
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        {"plain": {"a": [1, 2, {"b": "%(name)s"}]}},
+        [{"__template_repeat": True, "id": "%(name)s"}, {"id": "static"}],
+        {"top": {"__template_repeat": True, "id": "not expanded outside a list"}},
+        # directives produced by a template are handled by the later passes
+        [
+            {
+                "__template_repeat": {"filter": {"key": "kind", "match": "web"}},
+                "id": "%(name)s",
+                "children": {"__template_list": {"insert_key": "deps", "insert_val": "%(name)s-%(kind)s"}},
+            }
+        ],
+        # passes that insert values do not recurse into the rest of the node
+        {
+            "__template_list": {"insert_key": "items", "insert_val": {"v": "%(name)s"}},
+            "nested": {"__template_list": {"insert_key": "x", "insert_val": 1}},
+        },
+        {
+            "__template_props": [
+                {"insert_key": "k_%(name)s", "insert_val": [{"__template_repeat": True, "id": "%(kind)s"}]},
+            ],
+            "__template_list": {"insert_key": "items", "insert_val": "%(name)s"},
+        },
+        {"__template_props": DAG.from_assoclist("name", [{"name": "p", "insert_key": "%(name)s", "insert_val": 1}])},
+        {
+            "services": {
+                "__toposort": {
+                    "deps_key": "needs",
+                    "strip_unreachable": True,
+                    "required": ["app"],
+                    "id_to_key": "id",
+                },
+                "app": {"needs": ["db"], "replicas": [{"__template_repeat": True, "r": "%(name)s"}]},
+                "db": {"__template_repeat": True, "name": "db-%(name)s"},
+                "unused": {},
+            }
+        },
+        {"__template_list": None, "__template_props": [], "kept": 1},
+    ],
+)
+def test_transform_matches_sequential_passes(obj):
+    _assert_same(obj)
+
+
+def test_transform_shares_untouched_subtrees():
+    static = {"settings": {"a": [1, 2, {"b": 3}]}}
+    obj = {"static": static, "items": [{"__template_repeat": True, "id": "%(name)s"}]}
+    res = transform(COMPONENTS, obj)
+    assert res["static"] is static
+    assert res["items"] == [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+
+
+def test_transform_dumps_like_sequential_passes():
+    # containers carrying comments, flow style, anchors or merge keys are
+    # rebuilt, which drops those details, so they cannot be shared
+    doc = """
+    a: {x: 1, y: [1, 2]}  # trailing
+    b:
+      c: 1 # comment
+      d:
+      - [2, 3]
+    g: &anc
+      h: 1
+    i:
+      <<: *anc
+      j: 2
+    n:
+      # leading
+      o: 1
+    p:
+      q: {r: [x]}
+      s: "quoted"
+    list:
+    - __template_repeat: true
+      id: "%(name)s" # c
+      flow: {a: 1}
+    - plain: {z: 1}
+    """
+    yaml = create_yaml()
+    outputs = []
+    for func in (_sequential, transform):
+        buf = io.StringIO()
+        yaml.dump(func(COMPONENTS, yaml.load(doc)), buf)
+        outputs.append(buf.getvalue())
+    assert outputs[0] == outputs[1]
+    assert "#" not in outputs[1]
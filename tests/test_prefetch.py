@@ -0,0 +1,68 @@
+import pickle
+
+import pytest
+
+from avocado_config_gen import input_paths, load_file, run
+from avocado_config_gen.cache import FileCache
+from avocado_config_gen.prefetch import Prefetcher
+
+
+def test_prefetcher_loads(tmp_path):
+    paths = []
+    for i in range(5):
+        paths.append(str(tmp_path / f"input{i}.yaml"))
+        with open(paths[-1], "w") as f:
+            f.write(f"key: {i}\n")
+    loader = Prefetcher(load_file, jobs=2)
+    loader.prefetch(paths)
+    assert [loader(p)["key"] for p in reversed(paths)] == [4, 3, 2, 1, 0]
+    # paths that were not prefetched are loaded directly
+    assert loader(paths[0])["key"] == 0
+
+
+def test_prefetcher_missing_file(tmp_path):
+    loader = Prefetcher(load_file)
+    loader.prefetch([str(tmp_path / "missing.yaml")])
+    with pytest.raises(FileNotFoundError):
+        loader(str(tmp_path / "missing.yaml"))
+
+
+def test_run_prefetches_inputs():
+    config = [
+        {"output": "out1.yaml", "components": "c.yaml", "from": ["a.yaml", {"value": 1}, {"path": "b.yaml"}]},
+        {"output": "out2.yaml", "components": "c.yaml", "from": ["d.yaml", "a.yaml"]},
+    ]
+    assert input_paths(config) == ["c.yaml", "a.yaml", "b.yaml", "d.yaml"]
+    prefetched = []
+    run(
+        config, kont=lambda *a, **k: None, apply=lambda *a, **k: None, files={"out2.yaml"}, prefetch=prefetched.extend
+    )
+    assert prefetched == ["c.yaml", "d.yaml", "a.yaml"]
+
+
+def test_prefetcher_pickles(tmp_path):
+    path = str(tmp_path / "input.yaml")
+    with open(path, "w") as f:
+        f.write("key: 1\n")
+    loader = Prefetcher(load_file, jobs=2)
+    loader.prefetch([path])
+    # as sent to --jobs workers started by spawn or forkserver
+    copied = pickle.loads(pickle.dumps(loader))
+    assert copied(path) == {"key": 1}
+    copied.prefetch([path])
+    assert copied(path) == {"key": 1}
+
+
+def test_prefetcher_drops_finished_reads(tmp_path):
+    path = str(tmp_path / "input.yaml")
+    with open(path, "w") as f:
+        f.write("key: 1\n")
+    loader = Prefetcher(load_file)
+    cache = FileCache(loader)
+    for _ in range(3):
+        # after the first round, loads are served by the cache without reaching the prefetcher
+        loader.prefetch([path])
+        assert cache(path) == {"key": 1}
+        loader._pool.shutdown()
+        loader._pool = None
+        assert loader._pending == {}
@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from avocado_config_gen import dump_to_yaml, item_inputs, run
+from avocado_config_gen.state import BuildState, hash_entry
+
+
+def _setup(tmp_path):
+    for name in ["components.yaml", "a.yaml", "b.yaml"]:
+        (tmp_path / name).write_text(f"{name[0]}: 1\n")
+    return [
+        {
+            "output": str(tmp_path / "out1.yaml"),
+            "components": str(tmp_path / "components.yaml"),
+            "from": [str(tmp_path / "a.yaml")],
+        },
+        {
+            "output": str(tmp_path / "out2.yaml"),
+            "components": str(tmp_path / "components.yaml"),
+            "from": [str(tmp_path / "b.yaml"), {"value": {"x": 1}}],
+        },
+        {
+            "output": str(tmp_path / "out3.yaml"),
+            "components": str(tmp_path / "components.yaml"),
+            "from": [str(tmp_path / "out1.yaml")],
+        },
+    ]
+
+
+def _run(config, state_path):
+    generated = []
+
+    def apply(components, output, files, *, yaml=None):
+        generated.append(os.path.basename(output))
+        return {"output": output}
+
+    run(config, kont=dump_to_yaml, apply=apply, state=BuildState.load(state_path))
+    return generated
+
+
+def test_incremental_run(tmp_path):
+    config = _setup(tmp_path)
+    state_path = str(tmp_path / "state.json")
+
+    assert _run(config, state_path) == ["out1.yaml", "out2.yaml", "out3.yaml"]
+    assert _run(config, state_path) == []
+
+    (tmp_path / "b.yaml").write_text("b: 2\n")
+    assert _run(config, state_path) == ["out2.yaml"]
+
+    # out3 consumes out1, so it is regenerated along with it
+    (tmp_path / "a.yaml").write_text("a: 2\n")
+    assert _run(config, state_path) == ["out1.yaml", "out3.yaml"]
+
+    # changes to the config entry or the output itself are picked up
+    config[1]["from"][1]["value"]["x"] = 2
+    (tmp_path / "out3.yaml").write_text("edited: true\n")
+    assert _run(config, state_path) == ["out2.yaml", "out3.yaml"]
+
+    os.unlink(tmp_path / "out1.yaml")
+    assert _run(config, state_path) == ["out1.yaml", "out3.yaml"]
+
+
+def test_consumed_outputs_are_matched_by_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = _setup(tmp_path)
+    config[0]["output"] = "out1.yaml"
+    config[2]["from"] = ["./out1.yaml"]
+    state_path = str(tmp_path / "state.json")
+    _run(config, state_path)
+
+    (tmp_path / "a.yaml").write_text("a: 2\n")
+    assert _run(config, state_path) == ["out1.yaml", "out3.yaml"]
+
+
+def test_state_drops_removed_outputs(tmp_path):
+    config = _setup(tmp_path)
+    state_path = str(tmp_path / "state.json")
+    _run(config, state_path)
+    _run(config[:1], state_path)
+    assert set(BuildState.load(state_path).outputs) == {config[0]["output"]}
+
+
+def test_settings_changes_are_stale(tmp_path):
+    config = _setup(tmp_path)
+    state_path = str(tmp_path / "state.json")
+
+    def _run_with(settings):
+        state = BuildState.load(state_path, settings=settings)
+        return [i["output"] for i in state.select_stale(config, item_inputs)]
+
+    _run(config, state_path)
+    assert _run_with(None) == []
+    assert len(_run_with({"format": "json"})) == 3
+
+
+def test_hash_entry_is_the_same_in_every_process():
+    # set order follows hash randomisation and a DAG's repr holds its address
+    code = (
+        "from avocado_config_gen import create_yaml\n"
+        "from avocado_config_gen.state import hash_entry\n"
+        "doc = 'from: [{value: {s: !set [a, b, c, d, e, f], n: !assocbyname [{name: x}, {name: y}]}}]'\n"
+        "print(hash_entry(create_yaml().load(doc)))\n"
+    )
+    hashes = {
+        subprocess.run(
+            [sys.executable, "-c", code],
+            env={**os.environ, "PYTHONHASHSEED": seed},
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        for seed in ["1", "2", "3"]
+    }
+    assert len(hashes) == 1
+
+
+def test_hash_entry_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        hash_entry({"from": [{"value": object()}]})
@@ -1,4 +1,5 @@
 import io
+import pickle
 
 import pytest
 
@@ -105,3 +106,69 @@ def test_strset():
     r2 = y.load(b.getvalue())
     assert isinstance(r2, str)
     assert set(r2.splitlines()) == {"hello", "world", "foo", "bar"}
+
+
+def test_dag_prune_unreachable():
+    dag = tags.DAG(
+        objsbykey={k: {"name": k} for k in "abcde"},
+        successors={"a": {"b"}, "b": {"c"}, "d": {"e"}},
+        required_keys={"a"},
+    )
+    assert dag.finalize_to_list() == _to_named_list("cbaed")
+    # reachable from the required keys, following at least one edge
+    assert dag.finalize_to_list(prune_unreachable=True) == _to_named_list("cb")
+
+
+def test_assoclist_chain():
+    values = [{"name": k} for k in "cadb"]
+    dag = tags.NamedAssocList.from_assoclist("name", values)
+    # ordered by a single chain rather than every key's predecessors
+    assert dag.successors == {}
+    assert dag.chains == (tuple(("name", k) for k in "cadb"),)
+    assert not hasattr(dag, "__dict__")
+    assert dag.finalize_to_list() == values
+    assert dag.finalize_to_list(prune_unreachable=True) == values[:3]
+
+    other = tags.NamedAssocList.from_assoclist("name", [{"name": k} for k in "aeb"])
+    assert merge.merge(dag, other).finalize_to_list() == _to_named_list("cadeb")
+    assert pickle.loads(pickle.dumps(dag)) == dag
+
+
+def test_dag_chains_and_successors():
+    dag = tags.DAG(
+        objsbykey={k: {"name": k} for k in "abcdefg"},
+        successors={"f": {"g"}, "e": {"d"}},
+        required_keys={"e"},
+        chains=(tuple("cadb"), tuple("aeb")),
+    )
+    assert dag.finalize_to_list() == _to_named_list("cadebgf")
+    # a through the second chain, d by its successors and c through the first chain from either
+    assert dag.finalize_to_list(prune_unreachable=True) == _to_named_list("cad")
+
+    cycle = tags.DAG(objsbykey={k: {"name": k} for k in "ab"}, successors={}, chains=(tuple("ab"), tuple("ba")))
+    with pytest.raises(ValueError, match="Cycle"):
+        cycle.finalize_to_list()
+
+
+def test_dag_merge_many():
+    dags = [
+        tags.DAG.from_assoclist("name", [{"name": 1, "x": {"a": 1}}, {"name": 2}]),
+        tags.DAG.from_assoclist("name", [{"name": 2}, {"name": 3, "x": {"b": 1}}]),
+        tags.DAG.from_assoclist("name", [{"name": 1, "x": {"c": 1}}, {"name": 3}]),
+    ]
+    pairwise = merge.merge(merge.merge(dags[0], dags[1]), dags[2])
+    assert merge.merge_all(dags) == pairwise
+    assert pairwise.finalize_to_list() == [
+        {"name": 1, "x": {"a": 1, "c": 1}},
+        {"name": 2},
+        {"name": 3, "x": {"b": 1}},
+    ]
+    # the inputs are left as they were
+    assert dags[0].chains == ((("name", 1), ("name", 2)),)
+
+    # nodes shared by identity are taken as they are
+    node = {"name": 1}
+    a = tags.DAG({("name", 1): node}, {})
+    b = tags.DAG({("name", 1): node}, {})
+    assert merge.merge(a, b).objsbykey[("name", 1)] is node
+    assert merge.merge(a, a) == a
@@ -1,7 +1,16 @@
 import pytest
 
 from avocado_config_gen.tags import DAG
-from avocado_config_gen.template import apply_template, template_list, template_props, template_repeat
+from avocado_config_gen.template import (
+    ItemFilter,
+    apply_template,
+    compile_template,
+    filter_items,
+    literal_prefix,
+    template_list,
+    template_props,
+    template_repeat,
+)
 
 
 @pytest.mark.parametrize(
@@ -116,3 +125,41 @@ def test_template_props_list():
     input_dag = {"__template_props": DAG.from_assoclist("name", input2["__template_props"])}
     res2 = template_props(components, input_dag)
     assert res == res2
+
+
+def test_compile_template():
+    templ = {"id": "svc-%(name)s", "static": {"port": 80, "tags": ["web", "%(name)s"]}, "%(name)s_key": "100%%"}
+    render = compile_template(templ)
+    items = [{"name": "a"}, {"name": "b"}]
+    assert [render(i) for i in items] == [apply_template(i, templ) for i in items]
+    assert render({"name": "a"}) == {"id": "svc-a", "static": {"port": 80, "tags": ["web", "a"]}, "a_key": "100%"}
+    # every render gets fresh containers
+    assert render(items[0])["static"] is not render(items[0])["static"]
+
+
+@pytest.mark.parametrize(
+    "match",
+    ["web", "^web", "web-1", "", "^", "w.b", "^(web|db)", "db$", "nomatch", "web-1[0-9]"],
+)
+def test_item_filter(match):
+    items = [{"name": f"{kind}-{i}"} for i in range(20) for kind in ["web", "db", "webapp"]]
+    config = {"filter": {"key": "name", "match": match}}
+    select = ItemFilter(items)
+    res = select(config)
+    assert res == filter_items(items, config)
+    assert select(config) is res
+    assert select(True) is items
+
+
+@pytest.mark.parametrize(
+    ("pattern", "prefix"),
+    [("abc", "abc"), ("^abc", "abc"), ("a-b/c_d e", "a-b/c_d e"), ("a.c", None), ("abc$", None), ("a\\d", None)],
+)
+def test_literal_prefix(pattern, prefix):
+    assert literal_prefix(pattern) == prefix
+
+
+def test_item_filter_missing_key():
+    select = ItemFilter([{"name": "a"}, {"other": "b"}])
+    with pytest.raises(KeyError):
+        select({"filter": {"key": "name", "match": "a"}})
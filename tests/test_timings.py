@@ -0,0 +1,79 @@
+import json
+import tracemalloc
+
+import pytest
+
+from avocado_config_gen import apply_single, dump_to_yaml, main, run
+from avocado_config_gen.timings import Timings, stage
+
+
+def _write(path, content):
+    path.write_text(content)
+    return str(path)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_run_records_stages(tmp_path, jobs):
+    components = _write(tmp_path / "components.yaml", "- name: a\n")
+    inputs = [_write(tmp_path / f"input{i}.yaml", f"k{i}: 1\n") for i in range(2)]
+    config = [
+        {"output": str(tmp_path / f"output{i}.yaml"), "components": components, "from": [*inputs, {"value": {}}]}
+        for i in range(2)
+    ]
+    timings = Timings()
+    run(config, kont=dump_to_yaml, apply=apply_single, jobs=jobs, timings=timings)
+
+    report = timings.report()
+    assert [o["output"] for o in report["outputs"]] == [i["output"] for i in config]
+    for o in report["outputs"]:
+        assert [(s["stage"], s.get("input")) for s in o["stages"]] == [
+            ("load", components),
+            *(("load", p) for p in inputs),
+            ("load", None),
+            ("merge", None),
+            ("transform", None),
+            ("dump", None),
+        ]
+        assert all(s["time"] >= 0 for s in o["stages"])
+        assert all(s["peak"] > 0 for s in o["stages"])
+
+
+def test_load_stage_labels_custom_configs(tmp_path):
+    def loader(config, *, yaml=None):
+        return {"k": {"v": str(config)}}
+
+    timings = Timings(memory=False)
+    with timings.record("out.yaml") as record:
+        apply_single(tmp_path / "c.yaml", "out.yaml", [["x.yaml"]], loader=loader)
+    assert [s.get("input") for s in record.stages] == [str(tmp_path / "c.yaml"), "['x.yaml']", None, None]
+    # configs are left to the loader when not recording
+    assert apply_single(tmp_path / "c.yaml", "out.yaml", [["x.yaml"]], loader=loader) == {"k": {"v": "['x.yaml']"}}
+
+
+def test_stage_without_reset_peak(monkeypatch):
+    # python < 3.9
+    monkeypatch.delattr(tracemalloc, "reset_peak")
+    timings = Timings()
+    with timings.record("out.yaml") as record:
+        with stage("merge"):
+            pass
+    assert record.stages[0]["peak"] >= 0
+
+
+def test_stage_without_record():
+    with stage("merge"):
+        pass
+
+
+def test_main_timings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write(tmp_path / "components.yaml", "- name: a\n")
+    _write(tmp_path / "input.yaml", "a: 1\n")
+    _write(
+        tmp_path / ".template-config.yaml", "- {output: out.yaml, components: components.yaml, from: [input.yaml]}\n"
+    )
+    main(["--timings", "timings.json", "--profile", "profiles"])
+    with open(tmp_path / "timings.json") as f:
+        report = json.load(f)
+    assert [o["output"] for o in report["outputs"]] == ["out.yaml"]
+    assert (tmp_path / "profiles" / "out.yaml.prof").exists()
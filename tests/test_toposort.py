@@ -1,6 +1,6 @@
 import pytest
 
-from avocado_config_gen.toposort import do_toposort, order
+from avocado_config_gen.toposort import do_toposort, order, reachable, sort
 
 
 @pytest.mark.parametrize(
@@ -51,3 +51,34 @@ def test_do_toposort():
     res = do_toposort(input, config)
     ids = [i["id"] for i in res]
     assert ids == ["c", "d", "b", "a"]
+
+
+def test_order_deep_chain():
+    # deeper than the default recursion limit
+    n = 1500
+    input = {i: [i + 1] if i + 1 < n else [] for i in range(n)}
+    res, visible = order(input.keys(), input.get)
+    assert res == list(range(n))
+    assert visible[n - 2] == {n - 1}
+
+
+def test_order_self_reference():
+    input = {1: [1, 2], 2: []}
+    res, visible = order(input.keys(), input.get)
+    assert res == [1, 2]
+    assert visible == {1: {1, 2}, 2: {*[]}}
+
+
+def test_cycle_message():
+    input = {1: [2], 2: [3], 3: [1]}
+    with pytest.raises(ValueError, match="participating nodes: 3 -> 1"):
+        order(input.keys(), input.get)
+
+
+def test_sort_and_reachable():
+    input = {1: [2], 2: [3], 3: [], 4: [5], 5: [2], 6: [6]}
+    assert sort(input.keys(), input.get) == order(input.keys(), input.get)[0]
+    assert reachable([1], input.get) == {2, 3}
+    assert reachable([4, 1], input.get) == {5, 2, 3}
+    assert reachable([3], input.get) == {*[]}
+    assert reachable([6], input.get) == {6}
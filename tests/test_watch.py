@@ -0,0 +1,80 @@
+import os
+
+import avocado_config_gen
+from avocado_config_gen.watch import Watcher
+
+
+def _touch(path, content):
+    path.write_text(content)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_watcher_poll(tmp_path):
+    a = tmp_path / "a.yaml"
+    b = tmp_path / "b.yaml"
+    c = tmp_path / "c.yaml"
+    a.write_text("a: 1\n")
+    b.write_text("b: 1\n")
+    watcher = Watcher([str(a), str(b), str(c)])
+    assert watcher.poll([str(a), str(b), str(c)]) == set()
+
+    _touch(a, "a: 2\n")
+    c.write_text("c: 1\n")
+    assert watcher.poll([str(a), str(b), str(c)]) == {str(a), str(c)}
+    assert watcher.poll([str(a), str(b), str(c)]) == set()
+
+    os.unlink(b)
+    assert watcher.poll([str(a), str(b), str(c)]) == {str(b)}
+
+
+def test_watcher_new_paths_are_tracked(tmp_path):
+    a = tmp_path / "a.yaml"
+    a.write_text("a: 1\n")
+    watcher = Watcher([])
+    assert watcher.poll([str(a)]) == set()
+    _touch(a, "a: 2\n")
+    assert watcher.poll([str(a)]) == {str(a)}
+
+
+def _main_watching(monkeypatch, changes):
+    """run main in watch mode, saving each of changes in turn, and return out.yaml after every generation"""
+    outputs = []
+
+    def fake_watch(paths, on_change, *, interval):
+        outputs.append(avocado_config_gen.load_file("out.yaml"))
+        for path, content in changes:
+            path.write_text(content)
+            on_change({path.name})
+            outputs.append(avocado_config_gen.load_file("out.yaml"))
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(avocado_config_gen, "watch", fake_watch)
+    avocado_config_gen.main(["--watch"])
+    return outputs
+
+
+def _config(tmp_path, value):
+    (tmp_path / "components.yaml").write_text("- name: a\n")
+    (tmp_path / ".template-config.yaml").write_text(
+        f"- {{output: out.yaml, components: components.yaml, from: [input.yaml, {{value: {value}}}]}}\n"
+    )
+
+
+def test_main_watch_regenerates_the_same(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _config(tmp_path, "{jobs: {__toposort: {deps_key: d, strip_unreachable: false, id_to_key: id}, x: {}}}")
+    (tmp_path / "input.yaml").write_text("a: 1\n")
+    outputs = _main_watching(monkeypatch, [(tmp_path / "input.yaml", "a: 1\n")] * 2)
+    assert outputs == [{"a": 1, "jobs": [{"id": "x"}]}] * 3
+
+
+def test_main_watch_recovers_from_failed_dump(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    _config(tmp_path, "{}")
+    (tmp_path / "input.yaml").write_text("a: 1\n")
+    # a set of ints and strs cannot be sorted for dumping
+    changes = [(tmp_path / "input.yaml", "a: !set [1, x]\n"), (tmp_path / "input.yaml", "a: !set [1, 2]\n")]
+    outputs = _main_watching(monkeypatch, changes)
+    assert "TypeError" in capsys.readouterr().err
+    assert outputs == [{"a": 1}, {"a": 1}, {"a": [1, 2]}]